@@ -1,29 +1,197 @@
+import asyncio
 import sqlite3
 import functools
 from datetime import datetime
+import atexit
 import logging
+import logging.handlers
+import math
 import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
 
 # Ensure logs directory exists
 os.makedirs('logs', exist_ok=True)
 
-# Configure logging
-logging.basicConfig(
-    filename='logs/db_queries.log',
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
+# Configure logging: callers only enqueue records, and a background
+# listener thread does the file writes
+logger = logging.getLogger('db_queries')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_file_handler = logging.FileHandler('logs/db_queries.log')
+_file_handler.setFormatter(logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
-)
+))
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_listener = logging.handlers.QueueListener(_log_queue, _file_handler)
+_listener.start()
+# Flush whatever is still queued when the interpreter exits
+atexit.register(_listener.stop)
+
+
+class QueryStats:
+    """Per-statement call counts, rows and wall-time percentiles.
+
+    Only the last max_samples timings of each statement are kept for the
+    percentiles; counts and totals cover every call. At most max_statements
+    statements are tracked: queries with inlined literals each count as a
+    new one, so the least recently run are dropped (counted in evicted).
+    """
+
+    def __init__(self, max_samples=1000, max_statements=500):
+        self.max_samples = max_samples
+        self.max_statements = max_statements
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def record(self, query, elapsed_ms, rows=None, failed=False):
+        with self._lock:
+            entry = self._statements.get(query)
+            if entry is None:
+                entry = self._statements[query] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'samples': deque(maxlen=self.max_samples),
+                }
+                while len(self._statements) > self.max_statements:
+                    self._statements.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._statements.move_to_end(query)
+            entry['calls'] += 1
+            entry['errors'] += failed
+            entry['rows'] += rows or 0
+            entry['total_ms'] += elapsed_ms
+            entry['samples'].append(elapsed_ms)
+
+    def percentiles(self, query, percents=(50, 95, 99)):
+        """Return {percent: ms} over the recent timings of query (nearest rank)."""
+        with self._lock:
+            samples = sorted(self._statements[query]['samples'])
+        return self._percentiles(samples, percents)
+
+    @staticmethod
+    def _percentiles(samples, percents):
+        # samples must be sorted
+        return {
+            percent: samples[max(math.ceil(percent * len(samples) / 100), 1) - 1]
+            for percent in percents
+        }
+
+    def summary(self, percents=(50, 95, 99)):
+        """Return the stats of every statement, slowest total time first."""
+        with self._lock:
+            queries = list(self._statements)
+        report = []
+        for query in queries:
+            with self._lock:
+                entry = self._statements.get(query)
+                if entry is None:
+                    # Evicted since the list was taken
+                    continue
+                row = {
+                    'query': query,
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'rows': entry['rows'],
+                    'total_ms': round(entry['total_ms'], 3),
+                    'mean_ms': round(entry['total_ms'] / entry['calls'], 3),
+                }
+                samples = list(entry['samples'])
+            samples.sort()
+            row.update(
+                (f'p{percent}_ms', round(ms, 3))
+                for percent, ms in self._percentiles(samples, percents).items()
+            )
+            report.append(row)
+        return sorted(report, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.evicted = 0
+
+
+query_stats = QueryStats()
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        # A single fetchone() row
+        return 1
+    rowcount = getattr(result, 'rowcount', -1)
+    return rowcount if rowcount >= 0 else None
 
 # Decorator to log SQL queries
-def log_queries(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
+def log_queries(func=None, *, slow_ms=100, sample_rate=1.0, stats=None):
+    # Usable bare (@log_queries) or configured (@log_queries(sample_rate=0.1)).
+    # Calls faster than slow_ms are logged with probability sample_rate;
+    # slower ones and failures are always logged, as warnings/errors
+    if func is None:
+        return lambda func: log_queries(
+            func, slow_ms=slow_ms, sample_rate=sample_rate, stats=stats
+        )
+
+    recorder = query_stats if stats is None else stats
+
+    def started(args, kwargs):
         query = kwargs.get('query') if 'query' in kwargs else (args[0] if args else None)
+        params = kwargs.get('params') if 'params' in kwargs else (args[1] if len(args) > 1 else None)
         message = f"Executing SQL query: {query}"
         print(message)
-        logging.info(message)
-        return func(*args, **kwargs)
+        return query, params, message, time.perf_counter()
+
+    def failed(call, e):
+        query, params, message, start = call
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        recorder.record(query, elapsed_ms, failed=True)
+        logger.error(f"{message} params={params!r} failed after {elapsed_ms:.2f}ms: {e}")
+
+    def finished(call, result):
+        query, params, message, start = call
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rows = _row_count(result)
+        recorder.record(query, elapsed_ms, rows)
+        details = f"{message} params={params!r} rows={rows} time={elapsed_ms:.2f}ms"
+        if elapsed_ms >= slow_ms:
+            logger.warning(f"Slow query: {details}")
+        elif sample_rate >= 1 or random.random() < sample_rate:
+            logger.info(details)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            call = started(args, kwargs)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                failed(call, e)
+                raise
+            finished(call, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        call = started(args, kwargs)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            failed(call, e)
+            raise
+        finished(call, result)
+        return result
     return wrapper
 
 @log_queries
@@ -1,10 +1,310 @@
-import sqlite3 
+import asyncio
+import sqlite3
 import functools
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of sqlite3 connections to db_path.
+
+    At most size connections are opened; they are set up once (WAL journal,
+    synchronous=NORMAL) and reused by every borrower. Borrowers wait at most
+    timeout seconds for a free connection before PoolTimeout is raised.
+    After close(), borrowing fails and connections still borrowed are
+    closed when they are released.
+    """
+
+    def __init__(self, db_path='users.db', size=5, timeout=30):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._opened = 0
+        self._borrowed = 0
+        self._reused = 0
+        self._wait_time = 0.0
+
+    def _connect(self):
+        # Connections move between the threads that borrow them, one at a time
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError(
+                    f"Cannot borrow from the closed pool for {self.db_path}"
+                )
+            self._borrowed += 1
+            if self._idle.empty() and self._opened < self.size:
+                self._opened += 1
+                opening = True
+            else:
+                opening = False
+        if opening:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"No connection to {self.db_path} free after {self.timeout}s"
+            ) from None
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._reused += 1
+            self._wait_time += waited
+        return conn
+
+    def release(self, conn):
+        # Never hand the next borrower someone else's open transaction
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            closed = self._closed
+            if closed:
+                self._opened -= 1
+        if closed:
+            # Borrowed when the pool was closed; nobody will take it again
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def borrow(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'size': self.size,
+                'opened': self._opened,
+                'idle': self._idle.qsize(),
+                'in_use': self._opened - self._idle.qsize(),
+                'borrowed': self._borrowed,
+                'reused': self._reused,
+                'wait_time': round(self._wait_time, 6),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class AsyncConnectionPool:
+    """Bounded pool of aiosqlite connections for use on one event loop.
+
+    Same contract as ConnectionPool, but borrowers wait without blocking
+    the loop and acquire/release/borrow are coroutines.
+    """
+
+    def __init__(self, db_path='users.db', size=5, timeout=30):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = asyncio.LifoQueue()
+        self._closed = False
+        self._opened = 0
+        self._borrowed = 0
+        self._reused = 0
+        self._wait_time = 0.0
+
+    async def _connect(self):
+        import aiosqlite
+        conn = await aiosqlite.connect(self.db_path)
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError(
+                f"Cannot borrow from the closed pool for {self.db_path}"
+            )
+        # No awaits between the check and the increment, so no lock is needed
+        self._borrowed += 1
+        if self._idle.empty() and self._opened < self.size:
+            self._opened += 1
+            try:
+                return await self._connect()
+            except Exception:
+                self._opened -= 1
+                raise
+        start = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(
+                f"No connection to {self.db_path} free after {self.timeout}s"
+            ) from None
+        self._reused += 1
+        self._wait_time += time.perf_counter() - start
+        return conn
+
+    async def release(self, conn):
+        if conn.in_transaction:
+            await conn.rollback()
+        if self._closed:
+            # Borrowed when the pool was closed; nobody will take it again
+            await conn.close()
+            self._opened -= 1
+            return
+        self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def borrow(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def stats(self):
+        return {
+            'db_path': self.db_path,
+            'size': self.size,
+            'opened': self._opened,
+            'idle': self._idle.qsize(),
+            'in_use': self._opened - self._idle.qsize(),
+            'borrowed': self._borrowed,
+            'reused': self._reused,
+            'wait_time': round(self._wait_time, 6),
+        }
+
+    async def close(self):
+        self._closed = True
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            await conn.close()
+            self._opened -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# aiosqlite connections and asyncio queues belong to one event loop
+_async_pools = {}  # loop -> {db_path: pool}
+
+# Connections bound to the current thread with bind_connection
+_bound = threading.local()
+
+@contextmanager
+def bind_connection(conn, db_path='users.db'):
+    """Make synchronous with_db_connection calls for db_path on this thread
+    use conn, e.g. to run several decorated calls in one transaction."""
+    connections = _bound.__dict__.setdefault('connections', {})
+    previous = connections.get(db_path)
+    connections[db_path] = conn
+    try:
+        yield conn
+    finally:
+        if previous is None:
+            del connections[db_path]
+        else:
+            connections[db_path] = previous
+
+def get_pool(db_path='users.db', **options):
+    """Return the shared pool for db_path, creating it on first use."""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path, **options)
+        return _pools[db_path]
+
+async def _close_pools_on_shutdown(loop):
+    # Sleeps until asyncio.run cancels the tasks left at shutdown; the idle
+    # aiosqlite threads would otherwise keep the process alive
+    try:
+        await loop.create_future()
+    except asyncio.CancelledError:
+        await close_async_pools()
+        raise
+
+async def close_async_pools():
+    """Close the running event loop's shared pools and forget them."""
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+def get_async_pool(db_path='users.db', **options):
+    """Return the running event loop's shared pool for db_path.
+
+    The loop's pools are closed when asyncio.run shuts it down, or by
+    awaiting close_async_pools().
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _async_pools:
+        _async_pools[loop] = {}
+        loop.create_task(_close_pools_on_shutdown(loop))
+    pools = _async_pools[loop]
+    if db_path not in pools:
+        pools[db_path] = AsyncConnectionPool(db_path, **options)
+    return pools[db_path]
+
+def with_db_connection(func=None, *, db_path='users.db', pooled=False, pool=None):
+    # Bare @with_db_connection opens and closes a connection per call;
+    # @with_db_connection(pooled=True) borrows one from get_pool(db_path)
+    # and @with_db_connection(pool=...) from the given pool.
+    # Coroutine functions get aiosqlite connections instead, pooled through
+    # get_async_pool(db_path) or an AsyncConnectionPool given as pool
+    if func is None:
+        return lambda func: with_db_connection(
+            func, db_path=db_path, pooled=pooled, pool=pool
+        )
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            source = pool
+            if source is None and pooled:
+                source = get_async_pool(db_path)
+            if source is not None:
+                async with source.borrow() as conn:
+                    return await func(conn, *args, **kwargs)
+            import aiosqlite
+            async with aiosqlite.connect(db_path) as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
 
-def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
+        bound = getattr(_bound, 'connections', {}).get(db_path)
+        if bound is not None:
+            return func(bound, *args, **kwargs)
+        source = pool
+        if source is None and pooled:
+            source = get_pool(db_path)
+        if source is not None:
+            with source.borrow() as conn:
+                return func(conn, *args, **kwargs)
+        conn = sqlite3.connect(db_path)
         try:
             result = func(conn, *args, **kwargs)
             return result
@@ -18,5 +318,6 @@ def get_user_by_id(conn, user_id):
     return cursor.fetchone() 
 #### Fetch user by ID with automatic connection handling 
 
-user = get_user_by_id(user_id=1)
-print(user)
\ No newline at end of file
+if __name__ == "__main__":
+    user = get_user_by_id(user_id=1)
+    print(user)
@@ -1,19 +1,258 @@
+import asyncio
+import inspect
 import sqlite3 
 import functools
-with_db_connection=__import__('1-with_db_connection').with_db_connection
+import threading
+import time
+from itertools import islice
+from contextlib import asynccontextmanager, contextmanager
+connection_module=__import__('1-with_db_connection')
+with_db_connection=connection_module.with_db_connection
+
+WRITE_ACTIONS = frozenset({
+    sqlite3.SQLITE_INSERT,
+    sqlite3.SQLITE_UPDATE,
+    sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_DROP_TABLE,
+})
+READ_ACTIONS = frozenset({sqlite3.SQLITE_READ})
+
+_commit_listeners = []
+
+def add_commit_listener(listener):
+    """Call listener(conn, tables) after each commit made by transactional.
+
+    For aiosqlite connections the listener may return an awaitable, which
+    is awaited.
+    """
+    _commit_listeners.append(listener)
+
+# A connection has a single authorizer, so nested tracked_tables blocks
+# share one that feeds every collector active on it
+_collectors = {}  # id(conn) -> (authorizer, [(actions, tables), ...])
+
+def _push_collector(conn, actions):
+    """Start collecting on conn; return the tables set and the authorizer
+    feeding every collector on it.
+
+    The authorizer only runs when a statement is prepared, so it must be
+    installed again on every push: that expires the statements sqlite3
+    has cached, and a repeated query is prepared (and seen) again.
+    """
+    tables = set()
+    if id(conn) in _collectors:
+        authorizer, collectors = _collectors[id(conn)]
+        collectors.append((actions, tables))
+        return tables, authorizer
+    collectors = [(actions, tables)]
+
+    def authorizer(action, arg1, arg2, db_name, source):
+        if arg1:
+            for wanted, found in tuple(collectors):
+                if action in wanted:
+                    found.add(arg1.lower())
+        return sqlite3.SQLITE_OK
+    _collectors[id(conn)] = (authorizer, collectors)
+    return tables, authorizer
+
+def _pop_collector(conn, tables):
+    """Stop collecting into tables; return whether it was the last one."""
+    _, collectors = _collectors[id(conn)]
+    for i, (_, found) in enumerate(collectors):
+        if found is tables:
+            del collectors[i]
+            break
+    if collectors:
+        return False
+    del _collectors[id(conn)]
+    return True
+
+@contextmanager
+def tracked_tables(conn, actions):
+    """Collect the tables that statements run on conn touch with actions.
+
+    Uses SQLite's authorizer hook, so it sees the real tables behind joins,
+    subqueries and views rather than guessing from the SQL text. Blocks may
+    nest; each one sees the statements run while it is open.
+    """
+    tables, authorizer = _push_collector(conn, actions)
+    try:
+        conn.set_authorizer(authorizer)
+        yield tables
+    finally:
+        if _pop_collector(conn, tables):
+            conn.set_authorizer(None)
+
+@asynccontextmanager
+async def async_tracked_tables(conn, actions):
+    """tracked_tables for aiosqlite connections."""
+    tables, authorizer = _push_collector(conn, actions)
+    try:
+        await conn.set_authorizer(authorizer)
+        yield tables
+    finally:
+        if _pop_collector(conn, tables):
+            await conn.set_authorizer(None)
 
 def transactional(func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            try:
+                async with async_tracked_tables(conn, WRITE_ACTIONS) as written:
+                    result = await func(conn, *args, **kwargs)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise e
+            for listener in _commit_listeners:
+                notified = listener(conn, written)
+                if inspect.isawaitable(notified):
+                    await notified
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        batch = getattr(_active, 'batch', None)
+        if batch is not None and batch.conn is conn:
+            return batch.run(func, conn, *args, **kwargs)
         try:
-            result = func(conn, *args, **kwargs)
+            with tracked_tables(conn, WRITE_ACTIONS) as written:
+                result = func(conn, *args, **kwargs)
             conn.commit()
-            return result
         except Exception as e:
             conn.rollback()
             raise e
+        _notify_commit(conn, written)
+        return result
     return wrapper
 
+def _notify_commit(conn, written):
+    for listener in _commit_listeners:
+        listener(conn, written)
+
+# The batch (if any) running on the current thread
+_active = threading.local()
+
+
+class TransactionBatch:
+    """Group the transactional calls made inside it into fewer commits.
+
+    Decorated calls on the batch's connection each run inside a SAVEPOINT
+    of one open transaction: a call that raises is rolled back to its
+    savepoint alone, and the transaction is committed once max_ops calls
+    have succeeded or max_ms milliseconds have passed since it began
+    (checked after each call), and on leaving the block. If the block
+    raises, the uncommitted group is rolled back.
+
+    Without conn it opens one to db_path and binds it, so calls through
+    with_db_connection(db_path=...) on this thread share it.
+    """
+
+    def __init__(self, conn=None, db_path='users.db', max_ops=1000, max_ms=None):
+        self.conn = conn
+        self.db_path = db_path
+        self.max_ops = max_ops
+        self.max_ms = max_ms
+        self._owns_conn = conn is None
+        self._binding = None
+        self._outer = None
+        self._pending = 0
+        self._written = set()
+        self._began = None
+        self.ops = 0
+        self.failed_ops = 0
+        self.commits = 0
+        self.commit_ms = 0.0
+        self.max_commit_ms = 0.0
+
+    def __enter__(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path)
+        if self._owns_conn:
+            self._binding = connection_module.bind_connection(self.conn, self.db_path)
+            self._binding.__enter__()
+        self._outer = getattr(_active, 'batch', None)
+        _active.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            elif self.conn.in_transaction:
+                self.conn.rollback()
+        finally:
+            _active.batch = self._outer
+            if self._binding is not None:
+                self._binding.__exit__(None, None, None)
+            if self._owns_conn:
+                self.conn.close()
+
+    def run(self, func, conn, *args, **kwargs):
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        if self._began is None:
+            self._began = time.perf_counter()
+        conn.execute("SAVEPOINT transactional")
+        try:
+            with tracked_tables(conn, WRITE_ACTIONS) as written:
+                result = func(conn, *args, **kwargs)
+        except Exception:
+            conn.execute("ROLLBACK TO transactional")
+            conn.execute("RELEASE transactional")
+            self.failed_ops += 1
+            raise
+        conn.execute("RELEASE transactional")
+        self.ops += 1
+        self._pending += 1
+        self._written |= written
+        if self._pending >= self.max_ops or (
+            self.max_ms is not None
+            and (time.perf_counter() - self._began) * 1000 >= self.max_ms
+        ):
+            self.commit()
+        return result
+
+    def commit(self):
+        """Commit the calls made since the last commit, if any."""
+        if not self.conn.in_transaction:
+            return
+        start = time.perf_counter()
+        self.conn.commit()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.commits += 1
+        self.commit_ms += elapsed_ms
+        self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+        written, self._written, self._pending = self._written, set(), 0
+        self._began = None
+        _notify_commit(self.conn, written)
+
+    def stats(self):
+        return {
+            'ops': self.ops,
+            'failed_ops': self.failed_ops,
+            'commits': self.commits,
+            'ops_per_commit': round(self.ops / self.commits, 2) if self.commits else None,
+            'mean_commit_ms': round(self.commit_ms / self.commits, 3) if self.commits else None,
+            'max_commit_ms': round(self.max_commit_ms, 3),
+        }
+
+@contextmanager
+def _join(current):
+    yield current
+
+def batch(conn=None, db_path='users.db', max_ops=1000, max_ms=None):
+    """Start a TransactionBatch; a batch already running on this thread is
+    joined instead, so batches nest."""
+    current = getattr(_active, 'batch', None)
+    if current is not None and (conn is None or conn is current.conn):
+        return _join(current)
+    return TransactionBatch(conn, db_path, max_ops, max_ms)
+
+transactional.batch = batch
+
 @with_db_connection 
 @transactional 
 def update_user_email(conn, user_id, new_email): 
@@ -21,4 +260,66 @@ def update_user_email(conn, user_id, new_email):
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id)) 
 #### Update user's email with automatic transaction handling 
 
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
+def _chunks(pairs, chunk_size):
+    pairs = iter(pairs)
+    while True:
+        chunk = list(islice(pairs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+@with_db_connection
+@transactional
+def bulk_update_user_emails(conn, pairs, chunk_size=1000, temp_table_threshold=50000):
+    """Set users' emails from an iterable of (user_id, new_email) pairs in one
+    transaction, chunk_size pairs per executemany.
+
+    Sized collections of at least temp_table_threshold pairs are staged in
+    a temporary table instead and applied with a single joined UPDATE.
+    Returns one {'step', 'rows', 'ms'} timing per chunk (and for the join),
+    where rows is the number of rows the step changed: an 'update' or
+    'join' step short of the pairs given means some ids were not found.
+    """
+    use_temp_table = (
+        hasattr(pairs, '__len__') and len(pairs) >= temp_table_threshold
+    )
+    cursor = conn.cursor()
+    timings = []
+    if use_temp_table:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS email_updates "
+            "(id INTEGER PRIMARY KEY, email TEXT NOT NULL)"
+        )
+        cursor.execute("DELETE FROM email_updates")
+        statement = "INSERT OR REPLACE INTO email_updates (id, email) VALUES (?, ?)"
+        step = 'stage'
+    else:
+        statement = "UPDATE users SET email = ? WHERE id = ?"
+        step = 'update'
+    for chunk in _chunks(pairs, chunk_size):
+        if not use_temp_table:
+            chunk = [(email, user_id) for user_id, email in chunk]
+        start = time.perf_counter()
+        cursor.executemany(statement, chunk)
+        timings.append({
+            'step': step,
+            'rows': cursor.rowcount,
+            'ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+    if use_temp_table:
+        start = time.perf_counter()
+        cursor.execute(
+            "UPDATE users SET email = "
+            "(SELECT email FROM email_updates WHERE email_updates.id = users.id) "
+            "WHERE id IN (SELECT id FROM email_updates)"
+        )
+        timings.append({
+            'step': 'join',
+            'rows': cursor.rowcount,
+            'ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+        cursor.execute("DROP TABLE email_updates")
+    return timings
+
+if __name__ == "__main__":
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
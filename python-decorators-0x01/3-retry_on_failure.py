@@ -1,20 +1,141 @@
+import asyncio
 import time
-import sqlite3 
+import random
+import sqlite3
 import functools
+import threading
 with_db_connection=__import__("1-with_db_connection").with_db_connection
 
-# This decorator will retry the function if it raises an exception
-def retry_on_failure(retries, delay):
+# Lock contention that goes away if the caller simply tries again later
+TRANSIENT_ERRORS = ('database is locked', 'database table is locked', 'busy')
+
+
+class RetryError(Exception):
+    """Raised when every attempt failed; __cause__ is the last failure."""
+
+    def __init__(self, message, attempts):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def is_retryable(exc):
+    """Whether exc is a transient SQLite failure worth retrying."""
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(error in message for error in TRANSIENT_ERRORS)
+    return False
+
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.attempts = 0
+            self.retries = 0
+            self.successes = 0
+            self.not_retryable = 0
+            self.exhausted = 0
+            self.sleep_time = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'successes': self.successes,
+                'not_retryable': self.not_retryable,
+                'exhausted': self.exhausted,
+                'sleep_time': round(self.sleep_time, 6),
+            }
+
+
+retry_stats = RetryStats()
+
+# This decorator will retry the function if it raises a retryable exception
+def retry_on_failure(retries=3, delay=1, max_delay=30, deadline=None,
+                     retryable=is_retryable, stats=None):
+    """Retry the decorated function up to retries attempts in total.
+
+    After failed attempt n it sleeps a random time between 0 and
+    min(max_delay, delay * 2 ** n) seconds (exponential backoff with full
+    jitter), so contending callers spread out instead of retrying in step.
+    Only exceptions for which retryable(exc) is true are retried; others
+    propagate at once. Sleeps are cut short so the last attempt starts by
+    deadline seconds from the first call, and no attempt starts after it.
+    When retries or time run out, RetryError is raised from the last
+    failure. Coroutine functions are retried with asyncio.sleep.
+    """
+    if retries < 1:
+        raise ValueError(f"retries must be at least 1, not {retries}")
+    stats = retry_stats if stats is None else stats
+
+    def backoff(exc, attempt, start):
+        """Return how long to sleep before the next attempt, or raise."""
+        print(f"Attempt {attempt + 1} failed: {exc}")
+        if not retryable(exc):
+            stats.add(not_retryable=1)
+            return None
+        wait = random.uniform(0, min(max_delay, delay * 2 ** attempt))
+        out_of_time = False
+        if deadline is not None:
+            remaining = deadline - (time.monotonic() - start)
+            out_of_time = remaining <= 0
+            wait = min(wait, max(remaining, 0))
+        if attempt + 1 >= retries or out_of_time:
+            stats.add(exhausted=1)
+            raise RetryError(
+                f"All retry attempts failed ({attempt + 1} attempts).",
+                attempt + 1,
+            ) from exc
+        stats.add(retries=1, sleep_time=wait)
+        return wait
+
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                stats.add(calls=1)
+                start = time.monotonic()
+                for attempt in range(retries):
+                    stats.add(attempts=1)
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        wait = backoff(e, attempt, start)
+                        if wait is None:
+                            raise
+                        await asyncio.sleep(wait)
+                    else:
+                        stats.add(successes=1)
+                        return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            stats.add(calls=1)
+            start = time.monotonic()
             for attempt in range(retries):
+                stats.add(attempts=1)
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    print(f"Attempt {attempt + 1} failed: {e}")
-                    time.sleep(delay)
-            raise Exception("All retry attempts failed.")
+                    wait = backoff(e, attempt, start)
+                    if wait is None:
+                        raise
+                    time.sleep(wait)
+                else:
+                    stats.add(successes=1)
+                    return result
         return wrapper
     return decorator
 
@@ -27,5 +148,6 @@ def fetch_users_with_retry(conn):
 
 #### attempt to fetch users with automatic retry on failure
 
-users = fetch_users_with_retry()
-print(users)
\ No newline at end of file
+if __name__ == "__main__":
+    users = fetch_users_with_retry()
+    print(users)
@@ -1,21 +1,613 @@
+import asyncio
 import functools
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
 with_db_connection=__import__("1-with_db_connection").with_db_connection
+transactional_module=__import__("2-transactional")
 
+_MISSING = object()
+
+
+_caches = weakref.WeakSet()
+
+
+def database_identity(conn):
+    """Return a key for the database file conn is attached to."""
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == 'main':
+            # Every in-memory connection is its own database
+            return path or f"memory:{id(conn)}"
+    return f"memory:{id(conn)}"
+
+
+async def async_database_identity(conn):
+    """database_identity for aiosqlite connections."""
+    for _, name, path in await conn.execute_fetchall("PRAGMA database_list"):
+        if name == 'main':
+            return path or f"memory:{id(conn)}"
+    return f"memory:{id(conn)}"
+
+
+def invalidate_tables(database, tables):
+    """Drop cached results that read any of tables in database."""
+    tags = {(database, table.lower()) for table in tables}
+    for cache in list(_caches):
+        cache.invalidate_tags(tags)
+
+
+def _invalidate_committed(conn, tables):
+    if not tables:
+        return None
+    if not isinstance(conn, sqlite3.Connection):
+        # aiosqlite: transactional awaits the returned coroutine
+        return _async_invalidate_committed(conn, tables)
+    invalidate_tables(database_identity(conn), tables)
+
+
+async def _async_invalidate_committed(conn, tables):
+    # Disk tiers are updated in a worker thread, off the event loop
+    await asyncio.to_thread(
+        invalidate_tables, await async_database_identity(conn), tables
+    )
+
+
+transactional_module.add_commit_listener(_invalidate_committed)
+
+
+def _freeze(value):
+    """Turn call arguments into a hashable cache key component."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    return value
+
+
+def estimate_size(value):
+    """Rough deep size in bytes of a query result (rows of scalars)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return size
+
+
+class DiskCache:
+    """Persistent second cache tier: a local SQLite file of pickled results.
+
+    Values are stored zlib-compressed with an absolute (wall clock) expiry,
+    so they survive restarts. Once the stored values exceed max_bytes the
+    least recently read ones are deleted.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key BLOB PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                read_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_read_at ON entries (read_at);
+            CREATE TABLE IF NOT EXISTS tags (
+                tag BLOB NOT NULL,
+                key BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags (tag);
+            CREATE INDEX IF NOT EXISTS idx_tags_key ON tags (key);
+        """)
+        self.bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _dump(obj):
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _delete(self, keys):
+        for key in keys:
+            row = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self.bytes -= row[0]
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+
+    def get(self, key):
+        """Return (value, expires_at, tags) for key, or None."""
+        blob = self._dump(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (blob,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                self._delete([blob])
+                return None
+            self._conn.execute(
+                "UPDATE entries SET read_at = ? WHERE key = ?", (time.time(), blob)
+            )
+            tags = [pickle.loads(tag) for (tag,) in self._conn.execute(
+                "SELECT tag FROM tags WHERE key = ?", (blob,)
+            )]
+        return pickle.loads(zlib.decompress(value)), expires_at, tags
+
+    def set(self, key, value, expires_at=None, tags=()):
+        """Store value; expires_at is a time.time() timestamp or None."""
+        try:
+            data = zlib.compress(self._dump(value))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Results that cannot be pickled stay in memory only
+            return
+        blob = self._dump(key)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._delete([blob])
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, expires_at, read_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (blob, data, len(data), expires_at, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO tags (tag, key) VALUES (?, ?)",
+                [(self._dump(tag), blob) for tag in tags],
+            )
+            self.bytes += len(data)
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Expired entries go first, then the least recently read ones
+        expired = [key for (key,) in self._conn.execute(
+            "SELECT key FROM entries WHERE expires_at <= ?", (time.time(),)
+        )]
+        self._delete(expired)
+        if self.bytes <= self.max_bytes:
+            return
+        victims = []
+        excess = self.bytes - self.max_bytes
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY read_at"):
+            victims.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        self._delete(victims)
+
+    def invalidate(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._delete([self._dump(key)])
+
+    def invalidate_tags(self, tags):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for tag in tags:
+                self._delete([key for (key,) in self._conn.execute(
+                    "SELECT key FROM tags WHERE tag = ?", (self._dump(tag),)
+                ).fetchall()])
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM tags")
+            self.bytes = 0
+
+    def recent(self, limit):
+        """Yield (key, value, expires_at, tags) for up to limit unexpired
+        entries, most recently read first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM entries "
+                "WHERE expires_at IS NULL OR expires_at > ? "
+                "ORDER BY read_at DESC LIMIT ?", (time.time(), limit)
+            ).fetchall()
+        for (blob,) in rows:
+            key = pickle.loads(blob)
+            found = self.get(key)
+            if found is not None:
+                yield (key,) + found
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueryCache:
+    """Bounded LRU cache of query results.
+
+    Entries expire ttl seconds after being stored (None keeps them until
+    evicted). The least recently used entries are evicted once there are
+    more than max_entries of them or their estimated size exceeds max_bytes.
+    Entries can be stored with tags, e.g. the (database, table) pairs they
+    read, and dropped together through invalidate_tags.
+
+    With a DiskCache as disk, every stored result is also written there and
+    memory misses are looked up there, so results outlive the process; with
+    warm, the most recently read disk entries are loaded at start. aget and
+    aset do the disk work in a worker thread, for use on an event loop.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300,
+                 disk=None, warm=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, tags)
+        self._tagged = {}  # tag -> keys stored with that tag
+        self._lock = threading.RLock()
+        # Bumped by every invalidation, so a result computed while a write
+        # committed is not stored afterwards
+        self.generation = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.coalesced = 0
+        self.disk_hits = 0
+        _caches.add(self)
+        if disk is not None and warm:
+            for key, value, expires_at, tags in disk.recent(max_entries):
+                self._store(key, value, estimate_size(value),
+                            self._monotonic(expires_at), frozenset(tags))
+
+    @staticmethod
+    def _monotonic(expires_at):
+        # The disk tier keeps wall-clock expiry times, memory monotonic ones
+        if expires_at is None:
+            return None
+        return time.monotonic() + (expires_at - time.time())
+
+    def _remove(self, key):
+        _, size, _, tags = self._entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def _memory_get(self, key, default):
+        """Look key up in memory: return (value, None) if that settles it,
+        or (default, generation) if the disk tier must be read."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, expires_at, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, None
+                self._remove(key)
+                self.expirations += 1
+            if self.disk is None:
+                self.misses += 1
+                return default, None
+            return default, self.generation
+
+    def _disk_found(self, key, found, generation, default):
+        # Count a disk lookup and keep what it found in memory
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return default
+            value, expires_at, tags = found
+            self.hits += 1
+            self.disk_hits += 1
+            if generation == self.generation:
+                self._store(key, value, estimate_size(value),
+                            self._monotonic(expires_at), frozenset(tags))
+            return value
+
+    def get(self, key, default=None):
+        value, generation = self._memory_get(key, default)
+        if generation is None:
+            return value
+        # Read the disk tier without holding up other memory lookups
+        return self._disk_found(key, self.disk.get(key), generation, default)
+
+    async def aget(self, key, default=None):
+        """get for event loops: the disk tier is read in a worker thread."""
+        value, generation = self._memory_get(key, default)
+        if generation is None:
+            return value
+        found = await asyncio.to_thread(self.disk.get, key)
+        return self._disk_found(key, found, generation, default)
+
+    def _memory_set(self, key, value, ttl, tags, generation):
+        """Store value in memory; return the generation it was stored at,
+        or None if an invalidation since generation discarded it."""
+        size = estimate_size(value)
+        with self._lock:
+            if generation is None:
+                generation = self.generation
+            elif generation != self.generation:
+                return None
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            self._store(key, value, size, expires_at, tags)
+            return generation
+
+    def _disk_set(self, key, value, ttl, tags, generation):
+        self.disk.set(key, value, time.time() + ttl if ttl is not None else None,
+                      tags)
+        if generation != self.generation:
+            # Invalidated while it was being written
+            self.disk.invalidate(key)
+
+    def set(self, key, value, ttl=None, tags=(), generation=None):
+        """Store value under key, unless an invalidation happened since
+        generation (as read from self.generation before computing value)."""
+        ttl = self.ttl if ttl is None else ttl
+        tags = frozenset(tags)
+        generation = self._memory_set(key, value, ttl, tags, generation)
+        if generation is not None and self.disk is not None:
+            self._disk_set(key, value, ttl, tags, generation)
+
+    async def aset(self, key, value, ttl=None, tags=(), generation=None):
+        """set for event loops: the disk tier is written in a worker thread."""
+        ttl = self.ttl if ttl is None else ttl
+        tags = frozenset(tags)
+        generation = self._memory_set(key, value, ttl, tags, generation)
+        if generation is not None and self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value, ttl, tags,
+                                    generation)
+
+    def _store(self, key, value, size, expires_at, tags):
+        # Called with the lock held
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            # Caching it would evict everything else
+            return
+        self._entries[key] = (value, size, expires_at, tags)
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def record_coalesced(self):
+        """Count a miss that waited for another caller's query instead."""
+        with self._lock:
+            self.coalesced += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            if key in self._entries:
+                self._remove(key)
+        if self.disk is not None:
+            self.disk.invalidate(key)
+
+    def invalidate_tags(self, tags):
+        """Drop every entry stored with any of tags."""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._tagged.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+        if self.disk is not None:
+            self.disk.invalidate_tags(tags)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tagged.clear()
+            self.bytes = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'coalesced': self.coalesced,
+                'disk_hits': self.disk_hits,
+                'disk_bytes': self.disk.bytes if self.disk is not None else 0,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (
+                entry[2] is None or entry[2] > time.monotonic()
+            )
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Set QUERY_CACHE_PATH to keep cached results on disk across restarts
+query_cache = QueryCache(
+    disk=DiskCache(os.environ["QUERY_CACHE_PATH"])
+    if os.environ.get("QUERY_CACHE_PATH") else None
+)
+def cache_query(func=None, *, cache=None, ttl=None):
+    # Usable bare (@cache_query) or configured (@cache_query(ttl=60))
+    if func is None:
+        return lambda func: cache_query(func, cache=cache, ttl=ttl)
+
+    # Results are keyed on the database, the query and its bound parameters,
+    # and tagged with the tables the query read, so a commit through
+    # transactional that writes one of those tables evicts them
+    if asyncio.iscoroutinefunction(func):
+        return _async_cache_query(func, cache, ttl)
+
+    # Concurrent misses on one key share a single query: the first thread
+    # runs it and the others wait for its result
+    in_flight = {}  # key -> _Flight
+    in_flight_lock = threading.Lock()
 
-query_cache = {}
-def cache_query(func):
     @functools.wraps(func)
     def wrapper(conn, query, *args, **kwargs):
-        if query in query_cache:
+        if conn.in_transaction:
+            # It could read the transaction's uncommitted writes
+            return func(conn, query, *args, **kwargs)
+        store = query_cache if cache is None else cache
+        database = database_identity(conn)
+        key = (database, query, _freeze(args), _freeze(kwargs))
+        result = store.get(key, _MISSING)
+        if result is not _MISSING:
             print("Using cached result for query:", query)
-            return query_cache[query]
-        else:
+            return result
+        while True:
+            with in_flight_lock:
+                flight = in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = in_flight[key] = _Flight()
+            if leader:
+                break
+            print("Waiting for in-flight query:", query)
+            store.record_coalesced()
+            result = flight.wait()
+            if result is not _MISSING:
+                return result
+            # Its result was read inside a transaction; run the query again
+        try:
             print("Executing query:", query)
-            result = func(conn, query, *args, **kwargs)
-            query_cache[query] = result
+            generation = store.generation
+            with transactional_module.tracked_tables(
+                    conn, transactional_module.READ_ACTIONS) as tables:
+                result = func(conn, query, *args, **kwargs)
+            if conn.in_transaction:
+                # func began a transaction, so the result may be uncommitted
+                return result
+            tags = {(database, table) for table in tables}
+            store.set(key, result, ttl, tags=tags, generation=generation)
+            flight.result = result
             return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with in_flight_lock:
+                del in_flight[key]
+            flight.done.set()
     return wrapper
 
+class _Flight:
+    """A query one thread is running on behalf of all callers of its key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = _MISSING  # unless the result can be shared
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def _async_cache_query(func, cache, ttl):
+    # Concurrent misses on one key share a single query: the first caller
+    # runs it as a task, the others await that task
+    in_flight = {}  # (event loop, key) -> task
+
+    async def load(store, conn, key, database, query, args, kwargs):
+        print("Executing query:", query)
+        generation = store.generation
+        async with transactional_module.async_tracked_tables(
+                conn, transactional_module.READ_ACTIONS) as tables:
+            result = await func(conn, query, *args, **kwargs)
+        if conn.in_transaction:
+            # Not cached or shared: it may read uncommitted writes
+            return result, False
+        tags = {(database, table) for table in tables}
+        await store.aset(key, result, ttl, tags=tags, generation=generation)
+        return result, True
+
+    @functools.wraps(func)
+    async def async_wrapper(conn, query, *args, **kwargs):
+        if conn.in_transaction:
+            return await func(conn, query, *args, **kwargs)
+        store = query_cache if cache is None else cache
+        database = await async_database_identity(conn)
+        key = (database, query, _freeze(args), _freeze(kwargs))
+        result = await store.aget(key, _MISSING)
+        if result is not _MISSING:
+            print("Using cached result for query:", query)
+            return result
+        flight = (asyncio.get_running_loop(), key)
+        while flight in in_flight:
+            task = in_flight[flight]
+            print("Waiting for in-flight query:", query)
+            store.record_coalesced()
+            try:
+                # Shielded: cancelling a waiter must not cancel the query
+                result, shared = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                # The caller running it was cancelled; run it ourselves
+            else:
+                if shared:
+                    return result
+            # Or its result was read inside a transaction
+            if in_flight.get(flight) is task:
+                del in_flight[flight]
+        task = asyncio.ensure_future(
+            load(store, conn, key, database, query, args, kwargs)
+        )
+        in_flight[flight] = task
+        try:
+            result, _ = await task
+            return result
+        finally:
+            if in_flight.get(flight) is task:
+                del in_flight[flight]
+    return async_wrapper
+
 @with_db_connection
 @cache_query
 def fetch_users_with_cache(conn, query):
@@ -27,4 +619,4 @@ def fetch_users_with_cache(conn, query):
 users = fetch_users_with_cache(query="SELECT * FROM users")
 
 #### Second call will use the cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
\ No newline at end of file
+users_again = fetch_users_with_cache(query="SELECT * FROM users")
@@ -0,0 +1,250 @@
+import asyncio
+import time
+import sqlite3
+import functools
+import threading
+from collections import deque
+with_db_connection=__import__("1-with_db_connection").with_db_connection
+retry_module=__import__("3-retry_on_failure")
+retry_on_failure=retry_module.retry_on_failure
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the function while the circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(
+            f"Circuit {name!r} is open, retry in {retry_after:.1f}s"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stop calling a failing database until it has had time to recover.
+
+    closed: calls go through; failure_threshold failures within window
+    seconds open the circuit.
+    open: calls fail fast with CircuitOpenError for recovery_timeout seconds.
+    half_open: up to half_open_max_calls probe calls go through at once;
+    success_threshold successes close the circuit, any failure reopens it.
+
+    Only exceptions of the expected_exceptions types count as failures;
+    others propagate without affecting the circuit. on_state_change is
+    called as on_state_change(breaker, old_state, new_state).
+    """
+
+    def __init__(self, name='db', failure_threshold=5, window=60,
+                 recovery_timeout=30, half_open_max_calls=1,
+                 success_threshold=1,
+                 expected_exceptions=(sqlite3.Error, retry_module.RetryError),
+                 on_state_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.success_threshold = success_threshold
+        self.expected_exceptions = expected_exceptions
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = deque()  # monotonic times of recent failures
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+        self._episode = 0  # bumped by every transition
+        self._changes = []  # transitions not yet passed to on_state_change
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            state = self._current_state()
+            changes = self._take_changes()
+        self._notify(changes)
+        return state
+
+    def _current_state(self):
+        if self._state == OPEN and (
+            time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        # Called with the lock held; hooks run after it is released
+        old, self._state = self._state, state
+        self._episode += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._failures.clear()
+        if state != HALF_OPEN:
+            self._probes = 0
+        self._probe_successes = 0
+        self._changes.append((old, state))
+
+    def _take_changes(self):
+        changes, self._changes = self._changes, []
+        return changes
+
+    def _notify(self, changes):
+        if self.on_state_change is not None:
+            for old, new in changes:
+                self.on_state_change(self, old, new)
+
+    def _current_probe(self, admitted):
+        # A probe admitted before the circuit last changed state belongs to
+        # an earlier half-open episode and no longer holds a slot
+        state, episode = admitted
+        return state == HALF_OPEN and episode == self._episode
+
+    def _release_probe(self, admitted):
+        if self._current_probe(admitted) and self._probes > 0:
+            self._probes -= 1
+
+    def _before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (
+                state == HALF_OPEN and self._probes >= self.half_open_max_calls
+            ):
+                self.rejected += 1
+                retry_after = max(
+                    self._opened_at + self.recovery_timeout - time.monotonic(), 0
+                )
+                error = CircuitOpenError(self.name, retry_after)
+            else:
+                error = None
+                self.calls += 1
+                if state == HALF_OPEN:
+                    self._probes += 1
+            admitted = (state, self._episode)
+            changes = self._take_changes()
+        self._notify(changes)
+        if error is not None:
+            raise error
+        return admitted
+
+    def _after_call(self, admitted, failed):
+        with self._lock:
+            current = self._current_probe(admitted)
+            self._release_probe(admitted)
+            if failed:
+                self.failures += 1
+                now = time.monotonic()
+                self._failures.append(now)
+                while self._failures and self._failures[0] <= now - self.window:
+                    self._failures.popleft()
+                if self._state == HALF_OPEN or (
+                    self._state == CLOSED
+                    and len(self._failures) >= self.failure_threshold
+                ):
+                    self._transition(OPEN)
+            else:
+                self.successes += 1
+                if current:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.success_threshold:
+                        self._transition(CLOSED)
+            changes = self._take_changes()
+        self._notify(changes)
+
+    def call(self, func, *args, **kwargs):
+        admitted = self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.expected_exceptions:
+            self._after_call(admitted, failed=True)
+            raise
+        except BaseException:
+            # Not a database failure: release the probe slot, count nothing
+            with self._lock:
+                self._release_probe(admitted)
+            raise
+        self._after_call(admitted, failed=False)
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        admitted = self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except self.expected_exceptions:
+            self._after_call(admitted, failed=True)
+            raise
+        except BaseException:
+            with self._lock:
+                self._release_probe(admitted)
+            raise
+        self._after_call(admitted, failed=False)
+        return result
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.call_async(func, *args, **kwargs)
+            async_wrapper.breaker = self
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        wrapper.breaker = self
+        return wrapper
+
+    def reset(self):
+        with self._lock:
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+            changes = self._take_changes()
+        self._notify(changes)
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': state,
+                'calls': self.calls,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+                'recent_failures': len(self._failures),
+            }
+
+
+def circuit_breaker(**options):
+    """Decorator factory: @circuit_breaker(failure_threshold=3, ...)."""
+    return CircuitBreaker(**options)
+
+def log_state_change(breaker, old, new):
+    print(f"Circuit {breaker.name!r}: {old} -> {new}")
+
+db_breaker = CircuitBreaker('users.db', on_state_change=log_state_change)
+
+# The breaker sits outside the retries, so one exhausted retry loop counts
+# as one failure and an open circuit skips the retries entirely
+@db_breaker
+@with_db_connection
+@retry_on_failure(retries=3, delay=1)
+def fetch_users_with_retry(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users")
+    return cursor.fetchall()
+
+#### fetch users, failing fast while the database keeps failing
+
+if __name__ == "__main__":
+    users = fetch_users_with_retry()
+    print(len(users), db_breaker.stats())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Regression tests for cache_query invalidation through transactional.
+
+The decorator modules run their examples against users.db in the working
+directory when imported, so the tests run in a scratch directory holding
+a small users table.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_cwd = None
+_scratch = None
+transactional_module = None
+cache_module = None
+
+
+def setUpModule():
+    global _cwd, _scratch, transactional_module, cache_module
+    _cwd = os.getcwd()
+    _scratch = tempfile.mkdtemp()
+    os.chdir(_scratch)
+    conn = sqlite3.connect('users.db')
+    conn.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO users (id, name, email) VALUES (?, ?, ?)",
+        [(i, f"user{i}", f"user{i}@example.com") for i in range(1, 21)],
+    )
+    conn.commit()
+    conn.close()
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    transactional_module = __import__("2-transactional")
+    cache_module = __import__("4-cache_query")
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+class TestCachedReadsInTransactions(unittest.TestCase):
+    """Results cached inside a transactional call keep their table tags."""
+
+    def setUp(self):
+        self.cache = cache_module.QueryCache()
+        self.conn = sqlite3.connect('users.db')
+        self.addCleanup(self.conn.close)
+
+    def test_repeated_statement_is_tagged(self):
+        """A cached read repeating a prepared statement is still tagged."""
+        query = "SELECT email FROM users WHERE id=?"
+
+        @cache_module.cache_query(cache=self.cache)
+        def read(conn, query, user_id):
+            return conn.execute(query, (user_id,)).fetchall()
+
+        @transactional_module.transactional
+        def read_both(conn):
+            return read(conn, query, 10), read(conn, query, 11)
+
+        read_both(self.conn)
+        database = cache_module.database_identity(self.conn)
+        for user_id in (10, 11):
+            key = (database, query, cache_module._freeze((user_id,)),
+                   cache_module._freeze({}))
+            tags = self.cache._entries[key][3]
+            self.assertEqual(tags, {(database, 'users')})
+
+        transactional_module.update_user_email(
+            user_id=11, new_email='changed@example.com'
+        )
+        self.assertEqual(
+            read(self.conn, query, 11), [('changed@example.com',)]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,11 @@
-from seed import connect_to_prodev
-import mysql.connector
+from seed import Error, stream_query
 
-def stream_users():
+def stream_users(fetch_size=1000):
     try:
-        # Connect to ALX_prodev database using seed.py function
-        connection = connect_to_prodev()
-        if connection is None:
-            print("Failed to connect to database")
-            return
-
-        cursor = connection.cursor(dictionary=True)  # Return rows as dictionaries
-        cursor.execute("SELECT * FROM user_data")
-        
-        # Stream rows one by one with a single loop
-        for row in cursor:
-            yield row
-            
-        cursor.close()
-        connection.close()
-    except mysql.connector.Error as err:
-        print(f"Error streaming users: {err}")
\ No newline at end of file
+        # Stream rows from an unbuffered cursor, holding at most fetch_size
+        # rows in memory; the connection closes when the generator is closed
+        for rows in stream_query("SELECT * FROM user_data", fetch_size=fetch_size):
+            # Stream rows one by one with a single loop
+            yield from rows
+    except Error as err:
+        print(f"Error streaming users: {err}")
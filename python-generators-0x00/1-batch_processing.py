@@ -1,42 +1,71 @@
-from seed import connect_to_prodev
-import mysql.connector
+from contextlib import closing
+from seed import Error, stream_query
 
-def stream_users_in_batches(batch_size):
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+SQL_OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+def build_user_query(columns=None, where=None):
+    """Compile a projection and filter spec into (sql, params, python_filters).
+
+    columns limits the selected columns (all by default). where is a list of
+    (column, operator, value) comparisons, compiled into a parameterized
+    WHERE clause, and/or callables taking a row, which cannot be pushed down
+    and are returned to run in Python; their columns must be selected.
+    """
+    columns = tuple(columns or USER_COLUMNS)
+    for column in columns:
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}")
+
+    clauses, params, python_filters = [], [], []
+    for predicate in where or ():
+        if callable(predicate):
+            python_filters.append(predicate)
+            continue
+        column, operator, value = predicate
+        if column not in USER_COLUMNS or operator not in SQL_OPERATORS:
+            raise ValueError(f"Cannot compile predicate {predicate!r}")
+        clauses.append(f"{column} {operator} %s")
+        params.append(value)
+
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, tuple(params), python_filters
+
+def stream_users_in_batches(batch_size, columns=None, where=None, row_type='dict'):
+    """Generator that yields batches of users as seed.convert_rows row_type.
+
+    Python-side filters receive rows of that type, so they cannot be combined
+    with the column-oriented 'columns' type.
+    """
     try:
-        connection = connect_to_prodev()
-        if connection is None:
-            print("Failed to connect to database")
-            return
-
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
-        
-        batch = []
-        # Loop 1: Fetch rows and group into batches
-        for row in cursor:
-            batch.append(row)
-            if len(batch) == batch_size:
+        query, params, python_filters = build_user_query(columns, where)
+        if python_filters and row_type == 'columns':
+            raise ValueError("Python-side filters need row-oriented batches")
+        # Each fetchmany() call on the unbuffered cursor is one batch, so no
+        # more than batch_size rows are held in memory at a time
+        for batch in stream_query(query, params, fetch_size=batch_size,
+                                  row_type=row_type):
+            if python_filters:
+                batch = [row for row in batch
+                         if all(keep(row) for keep in python_filters)]
+            if batch:
                 yield batch
-                batch = []
-        
-        # Yield any remaining rows
-        if batch:
-            yield batch
-            
-        cursor.close()
-        connection.close()
-    except mysql.connector.Error as err:
+    except Error as err:
         print(f"Error streaming batches: {err}")
 
 def batch_processing(batch_size):
     try:
-        # Loop 2: Iterate over batches
-        for batch in stream_users_in_batches(batch_size):
-            # Loop 3: Filter users over 25
-            filtered_batch = [user for user in batch if user['age'] > 25]
-            if filtered_batch:
+        # The age > 25 filter is pushed down into SQL, so only matching rows
+        # are sent over the wire
+        batches = stream_users_in_batches(batch_size, where=[('age', '>', 25)])
+        # Loop 2: Iterate over batches; closing() releases the connection
+        # even if our own consumer stops early
+        with closing(batches):
+            for batch in batches:
                 # Yield each user individually
-                for user in filtered_batch:
+                for user in batch:
                     yield user
     except Exception as err:
         print(f"Error processing batches: {err}")
\ No newline at end of file
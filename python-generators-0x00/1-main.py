@@ -1,10 +1,13 @@
+from contextlib import closing
 from itertools import islice
 import importlib
 stream_users = importlib.import_module('0-stream_users').stream_users
 
-# Iterate over the generator function and print only the first 6 rows
+# Iterate over the generator function and print only the first 6 rows;
+# closing() releases the cursor and connection as soon as we stop early
 try:
-    for user in islice(stream_users(), 6):
-        print(user)
+    with closing(stream_users()) as users:
+        for user in islice(users, 6):
+            print(user)
 except Exception as e:
     print(f"Error streaming users: {e}")
\ No newline at end of file
@@ -1,21 +1,134 @@
+import queue
+import threading
+
 seed = __import__('seed')
 
+# Columns keyset pagination may seek on; each must be unique and indexed.
+# email only gets a unique index from the bulk/incremental loaders, so it
+# is not offered here
+KEYSET_COLUMNS = ('user_id',)
+
+# Message kinds passed from the read-ahead thread to the consumer
+_ITEM = 'item'
+_ERROR = 'error'
+_DONE = 'done'
+
 
 def paginate_users(page_size, offset):
     connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
+    cursor = connection.cursor()
     cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
+    columns = [description[0] for description in cursor.description]
+    rows = seed.convert_rows(columns, cursor.fetchall())
     connection.close()
     return rows
 
 
-def lazy_pagination(page_size):
-    """Generator that lazily fetches pages of users from the database."""
-    offset = 0
-    while True:
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        yield page
-        offset += page_size
+def _fetch_page_after(connection, page_size, after, key):
+    """Return (columns, rows) for the page whose key sorts after the value."""
+    if key not in KEYSET_COLUMNS:
+        raise ValueError(f"Cannot paginate on column {key!r}")
+    cursor = connection.cursor()
+    if after is None:
+        cursor.execute(
+            f"SELECT * FROM user_data ORDER BY {key} LIMIT %s", (page_size,)
+        )
+    else:
+        cursor.execute(
+            f"SELECT * FROM user_data WHERE {key} > %s ORDER BY {key} LIMIT %s",
+            (after, page_size)
+        )
+    columns = [description[0] for description in cursor.description]
+    rows = cursor.fetchall()
+    cursor.close()
+    return columns, rows
+
+
+def paginate_users_after(connection, page_size, after=None, key='user_id',
+                         row_type='dict'):
+    """Fetch the page of users whose key sorts after the given value."""
+    columns, rows = _fetch_page_after(connection, page_size, after, key)
+    return seed.convert_rows(columns, rows, row_type)
+
+
+def keyset_pagination(page_size, after=None, key='user_id', row_type='dict'):
+    """Generator that yields (page, token) pairs using keyset pagination.
+
+    Every page is a single index seek on one reused connection, so late pages
+    cost the same as early ones. token is the key of the last row on the page;
+    passing it back as after resumes the export right after that page. Pages
+    are converted with seed.convert_rows(row_type).
+    """
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        print("Failed to connect to database")
+        return
+    try:
+        while True:
+            columns, rows = _fetch_page_after(connection, page_size, after, key)
+            if not rows:
+                break
+            after = rows[-1][columns.index(key)]
+            yield seed.convert_rows(columns, rows, row_type), after
+    finally:
+        connection.close()
+
+
+def read_ahead(iterator, depth):
+    """Generator that runs iterator in a background thread, depth items ahead.
+
+    The bounded buffer blocks the thread once depth items are waiting
+    (backpressure). When the consumer stops, the thread finishes its current
+    item, closes iterator and exits before this generator returns.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                buffer.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((_ITEM, item)):
+                    return
+            put((_DONE, None))
+        except Exception as err:
+            put((_ERROR, err))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+        thread.join()
+
+
+def lazy_pagination(page_size, after=None, row_type='dict', read_ahead_pages=0):
+    """Generator that lazily fetches pages of users from the database.
+
+    With read_ahead_pages > 0 up to that many pages are fetched in a
+    background thread while the caller is still processing the current one.
+    """
+    pages = (page for page, _ in keyset_pagination(page_size, after,
+                                                   row_type=row_type))
+    if read_ahead_pages > 0:
+        pages = read_ahead(pages, read_ahead_pages)
+    yield from pages
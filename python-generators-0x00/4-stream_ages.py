@@ -1,30 +1,142 @@
+import math
+import sys
+import time
+from collections import Counter, defaultdict
+
 seed = __import__('seed')
 
 
 def stream_user_ages():
     """Generator that yields user ages one by one."""
     connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT age FROM user_data")
-    for row in cursor:
-        yield row['age']
-    connection.close()
+    if connection is None:
+        raise seed.Error("Failed to connect to database")
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT age FROM user_data")
+        for (age,) in cursor:
+            yield age
+    finally:
+        # Also runs when the consumer stops early and closes the generator
+        connection.close()
+
+
+def stream_user_age_chunks(chunk_size=5000):
+    """Generator that yields lists of at most chunk_size user ages."""
+    for rows in seed.stream_query("SELECT age FROM user_data", fetch_size=chunk_size):
+        yield [row['age'] for row in rows]
+
+
+def _age_histograms_pushdown(bucket_size):
+    """Let the database reduce user_data to {bucket: Counter(age -> users)}."""
+    histograms = defaultdict(Counter)
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        raise seed.Error("Failed to connect to database")
+    try:
+        cursor = connection.cursor()
+        if bucket_size:
+            cursor.execute(
+                f"SELECT {seed.backend.age_bucket_sql} AS bucket, age, COUNT(*) "
+                "FROM user_data GROUP BY bucket, age",
+                (bucket_size, bucket_size)
+            )
+        else:
+            cursor.execute("SELECT NULL, age, COUNT(*) FROM user_data GROUP BY age")
+        for bucket, age, count in cursor:
+            histograms[bucket][age] += count
+        cursor.close()
+    finally:
+        connection.close()
+    return histograms
+
+
+def _age_histograms_streaming(bucket_size, chunk_size):
+    """Build {bucket: Counter(age -> users)} from streamed fetchmany chunks."""
+    histograms = defaultdict(Counter)
+    for ages in stream_user_age_chunks(chunk_size):
+        # Counter() counts a whole chunk in C; only distinct ages reach Python
+        for age, count in Counter(ages).items():
+            bucket = age // bucket_size * bucket_size if bucket_size else None
+            histograms[bucket][age] += count
+    return histograms
+
 
+def _percentile(ages, histogram, count, percent):
+    """Nearest-rank percentile of a histogram whose keys are sorted in ages."""
+    rank = max(1, math.ceil(percent * count / 100))
+    seen = 0
+    for age in ages:
+        seen += histogram[age]
+        if seen >= rank:
+            return age
+    return ages[-1]
 
-def compute_average_age():
-    """Uses the stream_user_ages generator to compute average age efficiently."""
-    total = 0
-    count = 0
-    for age in stream_user_ages():
-        total += age
-        count += 1
 
+def _summarize(histogram, percentiles):
+    count = sum(histogram.values())
+    stats = {'count': count, 'avg': None, 'min': None, 'max': None}
+    for percent in percentiles:
+        stats[f'p{percent:g}'] = None
     if count == 0:
+        return stats
+    ages = sorted(histogram)
+    stats['avg'] = sum(age * users for age, users in histogram.items()) / count
+    stats['min'] = ages[0]
+    stats['max'] = ages[-1]
+    for percent in percentiles:
+        stats[f'p{percent:g}'] = _percentile(ages, histogram, count, percent)
+    return stats
+
+
+def aggregate_ages(percentiles=(), bucket_size=None, pushdown=True, chunk_size=5000):
+    """Return count/avg/min/max and the requested percentiles of user ages.
+
+    With pushdown=True the database groups ages itself and only one row per
+    distinct age crosses the wire; if that query fails we fall back to
+    reducing streamed chunks in Python. Both paths return the same shape:
+    a stats dict, or {bucket_start: stats} when bucket_size is given.
+    """
+    histograms = None
+    if pushdown:
+        try:
+            histograms = _age_histograms_pushdown(bucket_size)
+        except seed.Error as err:
+            print(f"Aggregate push-down failed, streaming instead: {err}")
+    if histograms is None:
+        histograms = _age_histograms_streaming(bucket_size, chunk_size)
+
+    if not bucket_size:
+        return _summarize(histograms.get(None, Counter()), percentiles)
+    return {
+        bucket: _summarize(histograms[bucket], percentiles)
+        for bucket in sorted(histograms)
+    }
+
+
+def compute_average_age(pushdown=True):
+    """Computes the average user age, in SQL when the backend allows it."""
+    average = aggregate_ages(pushdown=pushdown)['avg']
+    if average is None:
         print("Average age of users: 0")
     else:
-        average = total / count
         print(f"Average age of users: {average:.2f}")
 
 
+def benchmark_aggregations(repeat=3, percentiles=(50, 90, 99), bucket_size=10):
+    """Time the push-down and streaming paths of aggregate_ages side by side."""
+    for label, pushdown in (('push-down', True), ('streaming', False)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            aggregate_ages(percentiles, bucket_size, pushdown=pushdown)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:>10}: best {min(timings) * 1000:.1f} ms "
+              f"over {repeat} runs")
+
+
 if __name__ == "__main__":
-    compute_average_age()
+    if '--benchmark' in sys.argv[1:]:
+        benchmark_aggregations()
+    else:
+        compute_average_age()
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import queue
+
+seed = __import__('seed')
+build_user_query = __import__('1-batch_processing').build_user_query
+
+HEX_DIGITS = '0123456789abcdef'
+
+# Message kinds sent from partition workers to the merging generator
+_ROWS = 'rows'
+_ERROR = 'error'
+_DONE = 'done'
+
+
+def user_id_ranges(partitions):
+    """Split the UUID user_id keyspace into [low, high) ranges by leading digit.
+
+    None means the range is unbounded on that side, so the ranges together
+    cover every user_id.
+    """
+    partitions = max(1, min(partitions, len(HEX_DIGITS)))
+    bounds = [HEX_DIGITS[len(HEX_DIGITS) * i // partitions]
+              for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _scan_partition(low, high, columns, where, transform, batch_size, results):
+    """Worker process: stream one key range and send filtered batches back."""
+    try:
+        where = list(where or ())
+        if low is not None:
+            where.append(('user_id', '>=', low))
+        if high is not None:
+            where.append(('user_id', '<', high))
+        query, params, python_filters = build_user_query(columns, where)
+
+        for rows in seed.stream_query(query, params, fetch_size=batch_size):
+            if python_filters:
+                rows = [row for row in rows
+                        if all(keep(row) for keep in python_filters)]
+            if transform is not None:
+                rows = [transform(row) for row in rows]
+            if rows:
+                results.put((_ROWS, rows))
+    except Exception as err:
+        results.put((_ERROR, repr(err)))
+    finally:
+        results.put((_DONE, None))
+
+
+def partitioned_scan(partitions=None, columns=None, where=(('age', '>', 25),),
+                     transform=None, batch_size=1000, max_pending=8):
+    """Generator that scans user_data in parallel, one process per key range.
+
+    columns and where take the same spec as stream_users_in_batches and are
+    pushed down into each partition's query. Each worker opens its own
+    connection, applies any Python-only filters and transform to its rows and
+    sends batches through a queue holding at most max_pending batches, so
+    fast workers block instead of piling rows up in memory. Callables must be
+    picklable (module-level functions).
+    Rows are yielded one by one in arrival order, not in user_id order.
+    """
+    ranges = user_id_ranges(partitions or os.cpu_count() or 1)
+    results = multiprocessing.Queue(maxsize=max_pending)
+    workers = [
+        multiprocessing.Process(
+            target=_scan_partition,
+            args=(low, high, columns, where, transform, batch_size,
+                  results),
+            daemon=True
+        )
+        for low, high in ranges
+    ]
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    try:
+        while running:
+            try:
+                kind, payload = results.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("Partition workers exited unexpectedly")
+                continue
+            if kind == _DONE:
+                running -= 1
+            elif kind == _ERROR:
+                raise RuntimeError(f"Partition scan failed: {payload}")
+            else:
+                yield from payload
+    finally:
+        # Stops workers still blocked on a full queue if we were closed early
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+if __name__ == "__main__":
+    count = sum(1 for _ in partitioned_scan())
+    print(f"Users over 25: {count}")
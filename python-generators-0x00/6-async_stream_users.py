@@ -0,0 +1,93 @@
+import asyncio
+from contextlib import aclosing
+
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+lazy_pagination = __import__('2-lazy_paginate').lazy_pagination
+
+# Message kinds passed from the prefetching task to the consumer
+_ITEM = 'item'
+_ERROR = 'error'
+_DONE = 'done'
+_END = object()
+
+
+async def aiter_prefetched(iterator, prefetch=1):
+    """Async generator over a blocking iterator, read ahead in a worker thread.
+
+    Up to prefetch items are fetched while the consumer is still processing
+    the current one, so database IO and processing overlap without blocking
+    the event loop. The iterator is closed when the consumer stops early.
+    """
+    buffer = asyncio.Queue(maxsize=prefetch)
+    stopping = False
+
+    async def produce():
+        try:
+            while not stopping:
+                item = await asyncio.to_thread(next, iterator, _END)
+                if item is _END:
+                    await buffer.put((_DONE, None))
+                    return
+                await buffer.put((_ITEM, item))
+        except Exception as err:
+            await buffer.put((_ERROR, err))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            kind, value = await buffer.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise value
+            yield value
+    finally:
+        # Let the producer finish the fetch it is running in its thread (a
+        # generator cannot be closed mid-step), unblocking it if the buffer is
+        # full, then close the iterator off the event loop
+        stopping = True
+        while not producer.done():
+            while not buffer.empty():
+                buffer.get_nowait()
+            await asyncio.wait({producer}, timeout=0.05)
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+async def astream_users_in_batches(batch_size, prefetch=1, **options):
+    """Async counterpart of stream_users_in_batches; options are passed on."""
+    batches = stream_users_in_batches(batch_size, **options)
+    async with aclosing(aiter_prefetched(batches, prefetch)) as prefetched:
+        async for batch in prefetched:
+            yield batch
+
+
+async def astream_users(batch_size=1000, prefetch=1):
+    """Async counterpart of stream_users, fetching batch_size rows at a time."""
+    async with aclosing(astream_users_in_batches(batch_size, prefetch)) as batches:
+        async for batch in batches:
+            for user in batch:
+                yield user
+
+
+async def alazy_pagination(page_size, after=None, prefetch=1, row_type='dict'):
+    """Async counterpart of lazy_pagination."""
+    pages = lazy_pagination(page_size, after, row_type=row_type)
+    async with aclosing(aiter_prefetched(pages, prefetch)) as prefetched:
+        async for page in prefetched:
+            yield page
+
+
+async def main():
+    count = 0
+    async with aclosing(astream_users()) as users:
+        async for user in users:
+            print(user)
+            count += 1
+            if count == 6:
+                break
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,213 @@
+"""Export user_data to column-oriented chunk files and read them back via mmap.
+
+An export directory holds one file per column per chunk plus manifest.json:
+numeric columns are raw native arrays (chunk_00000.age.bin) and string
+columns are an int64 offsets array plus concatenated UTF-8 data, Arrow-style
+(chunk_00000.name.offsets / chunk_00000.name.data).
+
+    python 7-columnar_export.py export user_columns
+    python 7-columnar_export.py stats user_columns
+"""
+import glob
+import json
+import mmap
+import os
+import sys
+from array import array
+
+import seed
+
+build_user_query = __import__('1-batch_processing').build_user_query
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+def _write_strings(directory, prefix, values):
+    offsets = array('q', [0])
+    with open(os.path.join(directory, prefix + '.data'), 'wb') as data:
+        for value in values:
+            encoded = str(value).encode('utf-8')
+            data.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    with open(os.path.join(directory, prefix + '.offsets'), 'wb') as file:
+        offsets.tofile(file)
+
+
+def export_users(directory, batch_size=50000, columns=None, where=None):
+    """Write user_data to directory as columnar chunks of batch_size rows.
+
+    columns and where take the stream_users_in_batches spec, without
+    Python-side filters. Database errors propagate. Any previous export in
+    directory is removed first and the manifest is written last, so a
+    directory with a manifest holds one complete export.
+    Returns the number of rows exported.
+    """
+    query, params, python_filters = build_user_query(columns, where)
+    if python_filters:
+        raise ValueError("Python-side filters need row-oriented batches")
+    os.makedirs(directory, exist_ok=True)
+    stale = glob.glob(os.path.join(glob.escape(directory), 'chunk_*'))
+    for path in [os.path.join(directory, MANIFEST)] + stale:
+        if os.path.exists(path):
+            os.remove(path)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'rows': 0,
+        'columns': [],
+        'chunks': [],
+    }
+    batches = seed.stream_query(query, params, fetch_size=batch_size,
+                                row_type='columns', required=True)
+    for index, batch in enumerate(batches):
+        manifest['columns'] = list(batch)
+        chunk = {'rows': 0, 'types': {}}
+        for column, values in batch.items():
+            prefix = f'chunk_{index:05d}.{column}'
+            chunk['rows'] = len(values)
+            if isinstance(values, array):
+                with open(os.path.join(directory, prefix + '.bin'), 'wb') as file:
+                    values.tofile(file)
+                chunk['types'][column] = values.typecode
+            else:
+                _write_strings(directory, prefix, values)
+                chunk['types'][column] = 'str'
+        manifest['chunks'].append(chunk)
+        manifest['rows'] += chunk['rows']
+
+    temporary = os.path.join(directory, MANIFEST + '.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+    return manifest['rows']
+
+
+class StringColumn:
+    """Read-only sequence of strings decoded lazily from mmap'd buffers."""
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string column index out of range")
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return str(self._data[start:end], 'utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class ColumnStore:
+    """Memory-mapped reader for a directory written by export_users."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as file:
+            self.manifest = json.load(file)
+        if self.manifest['format'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format {self.manifest['format']}")
+        if self.manifest['byteorder'] != sys.byteorder:
+            raise ValueError("Export was written with a different byte order")
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    @property
+    def columns(self):
+        return list(self.manifest['columns'])
+
+    def _map(self, filename):
+        if filename not in self._maps:
+            path = os.path.join(self.directory, filename)
+            if os.path.getsize(path) == 0:
+                # mmap cannot map an empty file, e.g. a chunk of empty strings
+                return memoryview(b'')
+            with open(path, 'rb') as file:
+                self._maps[filename] = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        return memoryview(self._maps[filename])
+
+    def chunks(self, column):
+        """Generator that yields one zero-copy view of column per chunk.
+
+        Numeric chunks are memoryviews cast to their array typecode; string
+        chunks are StringColumn sequences.
+        """
+        if column not in self.manifest['columns']:
+            raise KeyError(column)
+        for index, chunk in enumerate(self.manifest['chunks']):
+            prefix = f'chunk_{index:05d}.{column}'
+            kind = chunk['types'][column]
+            if kind == 'str':
+                yield StringColumn(self._map(prefix + '.offsets').cast('q'),
+                                   self._map(prefix + '.data'))
+            else:
+                yield self._map(prefix + '.bin').cast(kind)
+
+    def numeric_stats(self, column):
+        """Return count/avg/min/max of a numeric column without hitting MySQL."""
+        count, total, low, high = 0, 0, None, None
+        for values in self.chunks(column):
+            if not len(values):
+                continue
+            count += len(values)
+            total += sum(values)
+            low = min(values) if low is None else min(low, min(values))
+            high = max(values) if high is None else max(high, max(values))
+        return {
+            'count': count,
+            'avg': total / count if count else None,
+            'min': low,
+            'max': high,
+        }
+
+    def where(self, column, predicate, columns=None):
+        """Generator that yields {column: value} rows where predicate(value)."""
+        columns = columns or self.columns
+        chunk_iters = [self.chunks(name) for name in columns]
+        for values, selected in zip(self.chunks(column), zip(*chunk_iters)):
+            for index, value in enumerate(values):
+                if predicate(value):
+                    yield {name: chunk[index]
+                           for name, chunk in zip(columns, selected)}
+
+    def close(self):
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a view; the map closes once it is freed
+                pass
+        self._maps = {}
+
+
+if __name__ == "__main__":
+    command, directory = sys.argv[1:3]
+    if command == 'export':
+        try:
+            rows = export_users(directory)
+        except seed.Error as err:
+            sys.exit(f"Export failed: {err}")
+        print(f"Exported {rows} users to {directory}")
+    elif command == 'stats':
+        with ColumnStore(directory) as store:
+            print(store.numeric_stats('age'))
+    else:
+        print(f"Unknown command {command!r}, expected 'export' or 'stats'")
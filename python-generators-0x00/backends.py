@@ -0,0 +1,198 @@
+"""Database backends for the generator scripts.
+
+seed.py and the streaming scripts talk to user_data through one of these
+backends, chosen with PRODEV_BACKEND in .env:
+
+- mysql (default): the ALX_prodev database on the MYSQL_HOST server, streamed
+  through unbuffered server-side cursors.
+- sqlite: a local file (PRODEV_SQLITE_PATH, default prodev.db) in WAL mode with
+  synchronous=NORMAL, for benchmarking without a MySQL server.
+
+Queries are written with MySQL's %s placeholders; SQLite connections accept
+them too. Statements whose syntax differs between the two come from the
+backend.
+"""
+import os
+import sqlite3
+
+
+class MySQLBackend:
+    name = 'mysql'
+    database = 'ALX_prodev'
+    supports_load_data = True
+    create_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL NOT NULL,
+            INDEX idx_user_id (user_id)
+        )
+        """
+    insert_ignore_sql = (
+        "INSERT IGNORE INTO user_data (user_id, name, email, age) "
+        "VALUES (%s, %s, %s, %s)"
+    )
+    upsert_sql = (
+        "INSERT INTO user_data (user_id, name, email, age) "
+        "VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE name = VALUES(name), age = VALUES(age)"
+    )
+    age_bucket_sql = "FLOOR(age / %s) * %s"
+
+    def __init__(self):
+        import mysql.connector
+        # The benchmark points this at its own database
+        self.database = os.getenv("PRODEV_MYSQL_DATABASE", self.database)
+        self.driver = mysql.connector
+        self.Error = mysql.connector.Error
+        self.PoolError = mysql.connector.errors.PoolError
+
+    def _options(self):
+        return {
+            'host': os.getenv("MYSQL_HOST", "localhost"),
+            'user': os.getenv("MYSQL_USER", "root"),
+            'password': os.getenv("MYSQL_PASSWORD", ""),
+        }
+
+    def identity(self):
+        """Return a string naming the database this backend writes to."""
+        options = self._options()
+        return f"mysql://{options['host']}/{self.database}"
+
+    def connect_server(self):
+        """Connect without selecting a database, to create ALX_prodev."""
+        return self.driver.connect(**self._options())
+
+    def connect(self, **options):
+        """Connect to the database; options override the connection settings,
+        e.g. allow_local_infile=True for LOAD DATA LOCAL INFILE."""
+        return self.driver.connect(
+            database=self.database, **dict(self._options(), **options)
+        )
+
+    def create_database(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        cursor.close()
+
+    def ensure_email_index(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data' "
+            "AND INDEX_NAME = 'idx_email'"
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("CREATE UNIQUE INDEX idx_email ON user_data (email)")
+            connection.commit()
+        cursor.close()
+
+    def stream_cursor(self, connection):
+        """Unbuffered cursor: rows stay on the server until fetched."""
+        return connection.cursor(buffered=False)
+
+    def is_alive(self, connection):
+        return connection.is_connected()
+
+    def reusable(self, connection):
+        # Unread streamed rows would leak into the next borrower's results
+        return not getattr(connection, 'unread_result', False)
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """Cursor that accepts the %s placeholders the scripts are written with."""
+
+    def execute(self, query, params=()):
+        return super().execute(query.replace('%s', '?'), params)
+
+    def executemany(self, query, seq_of_params):
+        return super().executemany(query.replace('%s', '?'), seq_of_params)
+
+
+class SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=SQLiteCursor):
+        return super().cursor(factory)
+
+
+class SQLitePoolError(sqlite3.Error):
+    pass
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    supports_load_data = False
+    Error = sqlite3.Error
+    PoolError = SQLitePoolError
+    create_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            age NUMERIC NOT NULL
+        )
+        """
+    insert_ignore_sql = (
+        "INSERT OR IGNORE INTO user_data (user_id, name, email, age) "
+        "VALUES (%s, %s, %s, %s)"
+    )
+    upsert_sql = (
+        "INSERT INTO user_data (user_id, name, email, age) "
+        "VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT (email) DO UPDATE SET name = excluded.name, age = excluded.age"
+    )
+    # Ages are non-negative integers, so integer division floors them
+    age_bucket_sql = "CAST(age / %s AS INTEGER) * %s"
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("PRODEV_SQLITE_PATH", "prodev.db")
+
+    def identity(self):
+        return f"sqlite://{os.path.abspath(self.path)}"
+
+    def connect_server(self):
+        return self.connect()
+
+    def connect(self):
+        # Pooled connections are handed between threads, one user at a time
+        connection = sqlite3.connect(
+            self.path, factory=SQLiteConnection, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def create_database(self, connection):
+        # The database file is created by connect()
+        pass
+
+    def ensure_email_index(self, connection):
+        connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_email ON user_data (email)"
+        )
+        connection.commit()
+
+    def stream_cursor(self, connection):
+        # SQLite cursors already step through results lazily
+        return connection.cursor()
+
+    def is_alive(self, connection):
+        try:
+            connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reusable(self, connection):
+        return True
+
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+
+
+def get_backend(name=None):
+    """Return the backend named name, or PRODEV_BACKEND (default mysql)."""
+    name = (name or os.getenv("PRODEV_BACKEND", "mysql")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
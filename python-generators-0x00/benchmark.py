@@ -0,0 +1,271 @@
+"""Benchmark the python-generators-0x00 streaming paths.
+
+Generates synthetic user_data rows into a benchmark database (a local
+SQLite file by default, or the configured MySQL server), then runs every
+streaming path at each batch/page size in a fresh process and reports
+rows/sec, latency to the first row and peak RSS:
+
+    python benchmark.py --rows 100000 --sizes 100 1000 10000 \\
+        --json report.json --markdown report.md
+
+With --backend mysql the rows go to a separate database (--mysql-database,
+default ALX_prodev_benchmark), never to ALX_prodev itself.
+
+Pass --baseline with an earlier JSON report to exit non-zero when a path
+got slower than --tolerance allows or read fewer rows, e.g. in a nightly
+job. A case whose worker crashes, runs past --case-timeout or reads no rows
+is reported as failed and also makes the run exit non-zero.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PATHS = (
+    'stream_users',
+    'batch_processing',
+    'lazy_pagination',
+    'average_age_pushdown',
+    'average_age_streaming',
+)
+
+
+def _path_items(path):
+    """Import one streaming path and return a function of the batch/page
+    size that iterates over its results."""
+    if path == 'stream_users':
+        stream_users = importlib.import_module('0-stream_users').stream_users
+        return lambda size: stream_users(fetch_size=size)
+    if path == 'batch_processing':
+        return importlib.import_module('1-batch_processing').batch_processing
+    if path == 'lazy_pagination':
+        lazy_pagination = importlib.import_module('2-lazy_paginate').lazy_pagination
+        return lambda size: (user for page in lazy_pagination(size) for user in page)
+    aggregate_ages = importlib.import_module('4-stream_ages').aggregate_ages
+    pushdown = path == 'average_age_pushdown'
+    return lambda size: iter([aggregate_ages(pushdown=pushdown, chunk_size=size)])
+
+
+def _peak_rss_kb():
+    # VmHWM belongs to this process image, while ru_maxrss on Linux carries
+    # over the RSS of the parent that forked the benchmark worker
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run_case(path, size, environment, results):
+    """Child process: time one path at one size and report the measurements."""
+    os.environ.update(environment)
+    # Keep imports and opening the pool out of the latency to the first row
+    items = _path_items(path)
+    seed = importlib.import_module('seed')
+    connection = seed.connect_to_prodev()
+    if connection is not None:
+        connection.close()
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    for item in items(size):
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        # Aggregates yield one stats dict covering every row they read
+        rows += int(item['count']) if path.startswith('average_age') else 1
+    elapsed = time.perf_counter() - start
+    results.put({
+        'path': path,
+        'size': size,
+        'rows': rows,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed else None,
+        'first_row_ms': round(first_row * 1000, 2) if first_row is not None else None,
+        'peak_rss_kb': _peak_rss_kb(),
+    })
+
+
+def generate_users(total, seed_value=0, chunk_size=10000):
+    """Top user_data up with synthetic users until it holds total rows."""
+    seed = importlib.import_module('seed')
+    server = seed.connect_db()
+    if server is None:
+        raise RuntimeError("Cannot connect to the benchmark database server")
+    seed.create_database(server)
+    server.close()
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        raise RuntimeError("Cannot connect to the benchmark database")
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = int(cursor.fetchone()[0])
+    for start in range(existing, total, chunk_size):
+        # Rows depend only on their index, so topping up a table is repeatable
+        generator = random.Random(f"{seed_value}:{start}")
+        values = [
+            (str(uuid.uuid5(uuid.NAMESPACE_URL, f"user{index}")),
+             f"User {index}", f"user{index}@example.com", generator.randint(1, 120))
+            for index in range(start, min(start + chunk_size, total))
+        ]
+        cursor.executemany(seed.backend.insert_ignore_sql, values)
+        connection.commit()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    rows = int(cursor.fetchone()[0])
+    cursor.close()
+    connection.close()
+    return rows
+
+
+def _wait_for_case(worker, results, timeout):
+    """Return the worker's measurements, or None if it died or timed out."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return results.get(timeout=min(1, max(deadline - time.monotonic(), 0.01)))
+        except queue.Empty:
+            if not worker.is_alive():
+                # It may have exited right after queueing its result
+                try:
+                    return results.get(timeout=1)
+                except queue.Empty:
+                    return None
+    return None
+
+def run_benchmarks(paths, sizes, environment, case_timeout=3600):
+    context = multiprocessing.get_context('spawn')
+    report = []
+    for path in paths:
+        for size in sizes:
+            # A fresh interpreter per case keeps peak RSS per path honest
+            results = context.Queue()
+            worker = context.Process(
+                target=_run_case, args=(path, size, environment, results)
+            )
+            worker.start()
+            case = _wait_for_case(worker, results, case_timeout)
+            if case is None:
+                if worker.is_alive():
+                    worker.terminate()
+                    error = f"timed out after {case_timeout}s"
+                else:
+                    error = f"worker exited with code {worker.exitcode}"
+                case = {'path': path, 'size': size, 'rows': None,
+                        'seconds': None, 'rows_per_sec': None,
+                        'first_row_ms': None, 'peak_rss_kb': None,
+                        'error': error}
+            elif not case['rows']:
+                # The streaming paths print database errors and stop early
+                case['error'] = "returned no rows"
+            worker.join()
+            report.append(case)
+    return report
+
+
+def to_markdown(report):
+    lines = [
+        "| path | size | rows | rows/sec | first row (ms) | peak RSS (KB) |",
+        "|---|---:|---:|---:|---:|---:|",
+    ]
+    for case in report:
+        if case.get('error'):
+            lines.append(f"| {case['path']} | {case['size']} | FAILED: {case['error']} | | | |")
+            continue
+        lines.append(
+            f"| {case['path']} | {case['size']} | {case['rows']} | "
+            f"{case['rows_per_sec']} | {case['first_row_ms']} | {case['peak_rss_kb']} |"
+        )
+    return "\n".join(lines)
+
+
+def find_regressions(report, baseline, tolerance):
+    """Return the cases that read fewer rows than in baseline or whose
+    rows/sec fell more than tolerance below it."""
+    previous = {(case['path'], case['size']): case for case in baseline}
+    regressions = []
+    for case in report:
+        before = previous.get((case['path'], case['size']))
+        if not before or before.get('error') or before['rows_per_sec'] is None:
+            continue
+        if case.get('error'):
+            # Already reported as failed
+            continue
+        if case['rows'] < before['rows'] or (
+            (case['rows_per_sec'] or 0) < before['rows_per_sec'] * (1 - tolerance)
+        ):
+            regressions.append((case, before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS))
+    parser.add_argument('--backend', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--db', default='benchmark.db',
+                        help="SQLite file to generate the data into")
+    parser.add_argument('--mysql-database', default='ALX_prodev_benchmark',
+                        help="MySQL database to generate the data into")
+    parser.add_argument('--case-timeout', type=float, default=3600,
+                        help="seconds before a single case counts as failed")
+    parser.add_argument('--json', help="write the report as JSON to this file")
+    parser.add_argument('--markdown', help="write the report as markdown to this file")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # The backend is chosen when seed is imported, so configure it first
+    environment = {
+        'PRODEV_BACKEND': args.backend,
+        'PRODEV_SQLITE_PATH': args.db,
+        'PRODEV_MYSQL_DATABASE': args.mysql_database,
+    }
+    os.environ.update(environment)
+    total = generate_users(args.rows)
+    print(f"user_data holds {total} rows ({args.backend})")
+
+    report = run_benchmarks(args.paths, args.sizes, environment, args.case_timeout)
+    markdown = to_markdown(report)
+    print(markdown)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.markdown:
+        with open(args.markdown, 'w') as file:
+            file.write(markdown + "\n")
+
+    failed = [case for case in report if case.get('error')]
+    for case in failed:
+        print(f"FAILED {case['path']} size {case['size']}: {case['error']}")
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(report, json.load(file), args.tolerance)
+        for case, before in regressions:
+            print(f"REGRESSION {case['path']} size {case['size']}: "
+                  f"{case['rows']} rows at {case['rows_per_sec']} rows/sec, "
+                  f"was {before['rows']} at {before['rows_per_sec']}")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,13 +10,16 @@ if connection:
 
     if connection:
         seed.create_table(connection)
-        seed.insert_data(connection, 'user_data.csv')
+        # Only CSV chunks changed since the last run are written
+        seed.insert_data_incremental(connection, 'user_data.csv')
         cursor = connection.cursor()
-        cursor.execute(f"SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = 'ALX_prodev';")
-        result = cursor.fetchone()
-        if result:
-            print(f"Database ALX_prodev is present ")
+        if seed.backend.name == 'mysql':
+            cursor.execute(f"SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = 'ALX_prodev';")
+            result = cursor.fetchone()
+            if result:
+                print(f"Database ALX_prodev is present ")
         cursor.execute(f"SELECT * FROM user_data LIMIT 5;")
         rows = cursor.fetchall()
         print(rows)
         cursor.close()
+        connection.close()
@@ -0,0 +1,34 @@
+"""Compare lazy_pagination throughput with and without read-ahead.
+
+Each page is "processed" for work_ms milliseconds to stand in for real
+per-page work, so the gain from overlapping fetches with processing shows:
+
+    python prefetch_benchmark.py [page_size] [work_ms] [read_ahead_pages]
+"""
+import sys
+import time
+
+lazy_pagination = __import__('2-lazy_paginate').lazy_pagination
+
+
+def run(page_size, work_ms, read_ahead_pages):
+    pages = rows = 0
+    start = time.perf_counter()
+    for page in lazy_pagination(page_size, read_ahead_pages=read_ahead_pages):
+        time.sleep(work_ms / 1000)
+        pages += 1
+        rows += len(page)
+    elapsed = time.perf_counter() - start
+    return pages, rows, elapsed
+
+
+def main(page_size=100, work_ms=5, read_ahead_pages=4):
+    for depth in (0, read_ahead_pages):
+        pages, rows, elapsed = run(page_size, work_ms, depth)
+        print(f"read-ahead {depth:>2}: {pages} pages, {rows} rows in "
+              f"{elapsed:.2f}s ({pages / elapsed:.1f} pages/sec, "
+              f"{rows / elapsed:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,55 @@
+"""Measure bytes per streamed user for each seed.ROW_TYPES representation.
+
+Rows are rebuilt from user_data.csv in the shape the MySQL cursor returns
+them (str user_id/name/email, Decimal age), so no database is needed:
+
+    python row_memory_benchmark.py [csv_file] [copies]
+"""
+import csv
+import sys
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+seed = __import__('seed')
+
+COLUMNS = ('user_id', 'name', 'email', 'age')
+
+
+def load_csv_rows(csv_file, copies):
+    with open(csv_file, 'r', newline='') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # Skip header
+        rows = [(name.encode(), email.encode(), age)
+                for name, email, age in csv_reader]
+    return rows * copies
+
+
+def fetched_rows(source):
+    """Build fresh row tuples, decoding strings as a cursor would."""
+    return [
+        (str(uuid.uuid4()), name.decode(), email.decode(), Decimal(age))
+        for name, email, age in source
+    ]
+
+
+def bytes_per_row(source, row_type):
+    tracemalloc.start()
+    rows = fetched_rows(source)
+    converted = seed.convert_rows(COLUMNS, rows, row_type)
+    del rows
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del converted
+    return used / len(source)
+
+
+def main(csv_file='user_data.csv', copies=10):
+    source = load_csv_rows(csv_file, copies)
+    print(f"{len(source)} rows")
+    for row_type in seed.ROW_TYPES:
+        print(f"{row_type:>8}: {bytes_per_row(source, row_type):7.1f} bytes/row")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2], *[int(arg) for arg in sys.argv[2:3]])
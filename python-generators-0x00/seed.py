@@ -1,62 +1,237 @@
-import mysql.connector
 import csv
 import uuid
 import os
+import time
+import functools
+import hashlib
+import json
+import threading
+import weakref
+from array import array
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from decimal import Decimal
 from dotenv import load_dotenv
 
+from backends import get_backend
+
 # Load environment variables from .env file
 load_dotenv()
 
+# MySQL by default; set PRODEV_BACKEND=sqlite to run against a local file
+backend = get_backend()
+Error = backend.Error
+
 def connect_db():
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST", "localhost"),
-            user=os.getenv("MYSQL_USER", "root"),
-            password=os.getenv("MYSQL_PASSWORD", "")
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return backend.connect_server()
+    except Error as err:
         print(f"Error connecting to MySQL: {err}")
         return None
 
 def create_database(connection):
     try:
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
-        cursor.close()
-    except mysql.connector.Error as err:
+        backend.create_database(connection)
+    except Error as err:
         print(f"Error creating database: {err}")
 
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool.
+
+    A proxy dropped without close() frees its pool slot when it is garbage
+    collected, closing the connection since its state is unknown.
+    """
+
+    def __init__(self, pool, connection, created):
+        self._pool = pool
+        self._connection = connection
+        self._created = created
+        self._abandoned = weakref.finalize(self, pool.abandon, connection)
+        # At exit the process is closing every connection anyway
+        self._abandoned.atexit = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            self._abandoned.detach()
+            self._pool.release(self._connection, self._created)
+            self._connection = None
+
+class ConnectionPool:
+    """Thread-safe pool of connections to the database of backend.
+
+    Up to size idle connections are kept for reuse and up to max_overflow
+    more may be opened under load; those are closed when returned. Borrowed
+    connections are health-checked, and replaced once older than recycle
+    seconds or idle for more than idle_timeout seconds. Borrowers wait at
+    most timeout seconds for a free slot before PoolError is raised.
+    """
+
+    def __init__(self, backend, size=5, max_overflow=5, timeout=30,
+                 recycle=3600, idle_timeout=300):
+        self.backend = backend
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.pid = os.getpid()
+        self._idle = deque()  # (connection, created, last_used)
+        self._available = threading.Condition()
+        self._in_use = 0
+        self._created = 0
+        self._borrowed = 0
+        self._discarded = 0
+        self._wait_time = 0.0
+
+    def _healthy(self, connection, created, last_used):
+        now = time.monotonic()
+        if now - created > self.recycle or now - last_used > self.idle_timeout:
+            return False
+        try:
+            return self.backend.is_alive(connection)
+        except self.backend.Error:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except self.backend.Error:
+            pass
+        with self._available:
+            self._discarded += 1
+
+    def _open(self):
+        connection = self.backend.connect()
+        with self._available:
+            self._created += 1
+        return connection, time.monotonic()
+
+    def acquire(self):
+        """Borrow a connection; close() on it returns it to the pool."""
+        start = time.perf_counter()
+        with self._available:
+            while not self._idle and self._in_use >= self.size + self.max_overflow:
+                remaining = start + self.timeout - time.perf_counter()
+                if remaining <= 0:
+                    raise self.backend.PoolError(
+                        "Timed out waiting for a pooled connection"
+                    )
+                self._available.wait(remaining)
+            self._in_use += 1
+            entry = self._idle.pop() if self._idle else None
+
+        try:
+            if entry is None:
+                connection, created = self._open()
+            else:
+                connection, created, last_used = entry
+                if not self._healthy(connection, created, last_used):
+                    self._discard(connection)
+                    connection, created = self._open()
+        except BaseException:
+            with self._available:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        with self._available:
+            self._borrowed += 1
+            self._wait_time += time.perf_counter() - start
+        return PooledConnection(self, connection, created)
+
+    def release(self, connection, created):
+        # A connection with unread streamed rows or a broken session is not
+        # safe to hand out again; an open transaction is rolled back so the
+        # next borrower gets a fresh snapshot
+        reusable = self.backend.reusable(connection)
+        if reusable and getattr(connection, 'in_transaction', False):
+            try:
+                connection.rollback()
+            except self.backend.Error:
+                reusable = False
+
+        with self._available:
+            self._in_use -= 1
+            keep = reusable and len(self._idle) < self.size
+            if keep:
+                self._idle.append((connection, created, time.monotonic()))
+            self._available.notify()
+        if not keep:
+            self._discard(connection)
+
+    def abandon(self, connection):
+        """Free the slot of a connection that was never returned."""
+        with self._available:
+            self._in_use -= 1
+            self._available.notify()
+        self._discard(connection)
+
+    @contextmanager
+    def borrow(self):
+        """Context manager that borrows a connection and always returns it."""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def metrics(self):
+        with self._available:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'borrowed': self._borrowed,
+                'discarded': self._discarded,
+                'wait_time': self._wait_time,
+                'avg_wait_time': self._wait_time / self._borrowed if self._borrowed else 0.0,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited from a parent process; their sockets belong to the parent,
+# so they are kept referenced and never closed from the child
+_inherited_pools = []
+
+def get_pool():
+    """Return the process-wide database pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid != os.getpid():
+            _inherited_pools.append(_pool)
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool(
+                backend,
+                size=int(os.getenv("PRODEV_POOL_SIZE", "5")),
+                max_overflow=int(os.getenv("PRODEV_POOL_MAX_OVERFLOW", "5")),
+                timeout=float(os.getenv("PRODEV_POOL_TIMEOUT", "30")),
+                recycle=float(os.getenv("PRODEV_POOL_RECYCLE", "3600")),
+                idle_timeout=float(os.getenv("PRODEV_POOL_IDLE_TIMEOUT", "300")),
+            )
+        return _pool
+
 def connect_to_prodev():
+    """Borrow a connection to ALX_prodev from the pool; close() returns it."""
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST", "localhost"),
-            user=os.getenv("MYSQL_USER", "root"),
-            password=os.getenv("MYSQL_PASSWORD", ""),
-            database="ALX_prodev"
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_pool().acquire()
+    except Error as err:
         print(f"Error connecting to ALX_prodev: {err}")
         return None
 
 def create_table(connection):
     try:
         cursor = connection.cursor()
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS user_data (
-            user_id VARCHAR(36) PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL,
-            age DECIMAL NOT NULL,
-            INDEX idx_user_id (user_id)
-        )
-        """
-        cursor.execute(create_table_query)
+        cursor.execute(backend.create_table_sql)
         connection.commit()
         print("Table user_data created successfully")
         cursor.close()
-    except mysql.connector.Error as err:
+    except Error as err:
         print(f"Error creating table: {err}")
 
 def insert_data(connection, csv_file):
@@ -79,7 +254,239 @@ def insert_data(connection, csv_file):
                     )
         connection.commit()
         cursor.close()
-    except mysql.connector.Error as err:
+    except Error as err:
         print(f"Error inserting data: {err}")
     except FileNotFoundError:
-        print(f"CSV file {csv_file} not found")
\ No newline at end of file
+        print(f"CSV file {csv_file} not found")
+
+def ensure_email_index(connection):
+    """Add a unique index on user_data.email so the database rejects duplicates."""
+    try:
+        backend.ensure_email_index(connection)
+    except Error as err:
+        print(f"Error creating email index: {err}")
+
+def read_csv_chunks(csv_file, chunk_size):
+    """Generator that yields (name, email, age) rows from csv_file in chunks."""
+    with open(csv_file, 'r', newline='') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # Skip header
+        chunk = []
+        for row in csv_reader:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def _chunk_values(chunk):
+    """Build insert parameters for a CSV chunk, keeping the first row per email."""
+    seen = set()
+    values = []
+    for name, email, age in chunk:
+        if email in seen:
+            continue
+        seen.add(email)
+        values.append((str(uuid.uuid4()), name, email, age))
+    return values
+
+def insert_data_bulk(connection, csv_file, chunk_size=5000, use_load_data=False):
+    """Bulk-load csv_file into user_data, committing once per chunk.
+
+    Duplicate emails are dropped in memory within a chunk and against the
+    table through the unique email index and INSERT IGNORE. With
+    use_load_data=True the file is handed to LOAD DATA LOCAL INFILE instead,
+    over a dedicated connection opened with allow_local_infile=True (the
+    server must have local_infile enabled too). Returns the number of rows
+    inserted.
+    """
+    start = time.perf_counter()
+    inserted = 0
+    try:
+        ensure_email_index(connection)
+        cursor = connection.cursor()
+        if use_load_data and not backend.supports_load_data:
+            print(f"{backend.name} has no LOAD DATA, using executemany")
+        if use_load_data and backend.supports_load_data:
+            # The connector refuses LOCAL INFILE unless the connection opts in,
+            # and pooled connections deliberately do not
+            if not os.path.exists(csv_file):
+                raise FileNotFoundError(csv_file)
+            load_connection = backend.connect(allow_local_infile=True)
+            try:
+                load_cursor = load_connection.cursor()
+                load_cursor.execute(
+                    "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data "
+                    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    "LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+                    "(name, email, age) SET user_id = UUID()",
+                    (os.path.abspath(csv_file),)
+                )
+                inserted = load_cursor.rowcount
+                load_connection.commit()
+                load_cursor.close()
+            finally:
+                load_connection.close()
+        else:
+            for chunk in read_csv_chunks(csv_file, chunk_size):
+                cursor.executemany(backend.insert_ignore_sql, _chunk_values(chunk))
+                inserted += cursor.rowcount
+                connection.commit()
+        cursor.close()
+    except Error as err:
+        print(f"Error bulk inserting data: {err}")
+    except FileNotFoundError:
+        print(f"CSV file {csv_file} not found")
+
+    elapsed = time.perf_counter() - start
+    rate = inserted / elapsed if elapsed > 0 else 0
+    print(f"Inserted {inserted} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return inserted
+
+def chunk_fingerprint(chunk):
+    """Return a stable hash of a list of CSV rows."""
+    digest = hashlib.sha1()
+    for row in chunk:
+        digest.update('\x1f'.join(row).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+def _load_seed_state(state_file, chunk_size, database):
+    try:
+        with open(state_file, 'r') as file:
+            state = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return []
+    # Fingerprints only describe the database they were written to
+    if state.get('chunk_size') != chunk_size or state.get('database') != database:
+        return []
+    return state.get('chunks', [])
+
+def _save_seed_state(state_file, chunk_size, database, fingerprints):
+    temporary = state_file + '.tmp'
+    with open(temporary, 'w') as file:
+        json.dump({'chunk_size': chunk_size, 'database': database,
+                   'chunks': fingerprints}, file)
+    os.replace(temporary, state_file)
+
+def insert_data_incremental(connection, csv_file, state_file=None, chunk_size=10000):
+    """Upsert only the CSV chunks that changed since the previous run.
+
+    Per-chunk fingerprints are kept in a sidecar state file (csv_file +
+    '.seedstate.json' by default) and saved after every committed chunk, so
+    an interrupted run resumes where it stopped. The state is ignored when
+    it was written for another database or user_data is empty. Changed chunks are upserted
+    on the unique email index, keeping existing user_ids. Rows deleted from
+    the CSV are not deleted from the table. Returns the number of chunks
+    upserted.
+    """
+    state_file = state_file or csv_file + '.seedstate.json'
+    start = time.perf_counter()
+    database = backend.identity()
+    previous = _load_seed_state(state_file, chunk_size, database)
+    fingerprints = []
+    changed = rows = 0
+    try:
+        ensure_email_index(connection)
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM user_data LIMIT 1")
+        if previous and cursor.fetchone() is None:
+            print("user_data is empty, reloading every chunk")
+            previous = []
+        # Drain the result so the connection can run the upserts
+        cursor.fetchall()
+        for index, chunk in enumerate(read_csv_chunks(csv_file, chunk_size)):
+            fingerprint = chunk_fingerprint(chunk)
+            fingerprints.append(fingerprint)
+            if index < len(previous) and previous[index] == fingerprint:
+                continue
+            cursor.executemany(backend.upsert_sql, _chunk_values(chunk))
+            connection.commit()
+            changed += 1
+            rows += len(chunk)
+            _save_seed_state(state_file, chunk_size, database,
+                             fingerprints + previous[index + 1:])
+        _save_seed_state(state_file, chunk_size, database, fingerprints)
+        cursor.close()
+    except Error as err:
+        print(f"Error seeding data incrementally: {err}")
+    except FileNotFoundError:
+        print(f"CSV file {csv_file} not found")
+
+    elapsed = time.perf_counter() - start
+    print(f"Upserted {changed} of {len(fingerprints)} chunks ({rows} rows) "
+          f"in {elapsed:.2f}s")
+    return changed
+
+ROW_TYPES = ('dict', 'record', 'columns')
+
+@functools.lru_cache(maxsize=None)
+def record_type(columns):
+    """Return a namedtuple class for columns; rows carry no per-row dict."""
+    return namedtuple('UserRecord', columns)
+
+def to_native(value):
+    """Convert a Decimal to int when it is integral and to float otherwise."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+def column_batch(columns, rows):
+    """Transpose rows into {column: values}, packing numbers into arrays."""
+    batch = {column: [] for column in columns}
+    for column, values in zip(columns, zip(*rows)):
+        values = [to_native(value) for value in values]
+        if all(type(value) is int for value in values):
+            batch[column] = array('q', values)
+        elif all(type(value) in (int, float) for value in values):
+            batch[column] = array('d', values)
+        else:
+            batch[column] = values
+    return batch
+
+def convert_rows(columns, rows, row_type='dict'):
+    """Convert fetched row tuples to row_type.
+
+    'dict' gives the usual {column: value} rows, 'record' gives UserRecord
+    namedtuples and 'columns' gives one column-oriented batch for all rows.
+    The compact types also turn Decimal values into native ints/floats.
+    """
+    if row_type == 'dict':
+        return [dict(zip(columns, row)) for row in rows]
+    if row_type == 'record':
+        record = record_type(tuple(columns))
+        return [record._make(map(to_native, row)) for row in rows]
+    if row_type == 'columns':
+        return column_batch(columns, rows)
+    raise ValueError(f"Unknown row type {row_type!r}, expected one of {ROW_TYPES}")
+
+def stream_query(query, params=None, fetch_size=1000, row_type='dict',
+                 required=False):
+    """Generator that yields batches of at most fetch_size rows for query.
+
+    Rows come from the backend's streaming cursor (server-side on MySQL),
+    so no more than fetch_size rows are held client-side at a time, and each
+    batch is converted with convert_rows(row_type). The connection is closed
+    as soon as the generator finishes or is closed by the consumer. If no
+    connection can be made it yields nothing, or raises Error if required.
+    """
+    connection = connect_to_prodev()
+    if connection is None:
+        if required:
+            raise Error("Failed to connect to database")
+        print("Failed to connect to database")
+        return
+    try:
+        cursor = backend.stream_cursor(connection)
+        cursor.execute(query, params or ())
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield convert_rows(columns, rows, row_type)
+        cursor.close()
+    finally:
+        # Closing the connection also discards any unread server-side rows
+        connection.close()